@@ -0,0 +1,358 @@
+"""
+Doctor availability from weekly schedules.
+
+Slots are generated from a doctor's Schedule rows in the doctor's timezone
+(WEEKS_AHEAD weeks of SLOT_MINUTES slots per scheduled day). Occupied times
+(Scheduled appointments, unexpired reservations and paid holds) for every
+doctor and the whole window are read with one query, sorted, and each slot is
+checked with a binary search, so the cost does not grow with the number of
+slots.
+
+Multi-doctor lookups (DoctorsAvailabilityView, AvailabilitySearchView, the
+booking pre-check) use cached per-doctor, per-day slot bitmaps instead; see
+below.
+"""
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, time as dt_time, timedelta
+
+import pytz
+from dateutil.relativedelta import relativedelta, MO, TU, WE, TH, FR, SA, SU
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, Q, Value, When
+from django.utils import timezone
+
+from user.models import Schedule
+
+from .models import PAID_STATUSES, Appointment, AppointmentReservation
+
+SLOT_MINUTES = 30
+WEEKS_AHEAD = 12
+
+# previous-or-same occurrence of the day; week 0 may be earlier this week
+WEEKDAYS = {
+    'Monday': MO(-1),
+    'Tuesday': TU(-1),
+    'Wednesday': WE(-1),
+    'Thursday': TH(-1),
+    'Friday': FR(-1),
+    'Saturday': SA(-1),
+    'Sunday': SU(-1),
+}
+
+
+def schedule_slots(schedules, doctor_tz, now=None, weeks=WEEKS_AHEAD):
+    """(start, end) pairs in doctor_tz for each schedule, week by week."""
+    now = (now or timezone.now()).astimezone(doctor_tz)
+    slot = timedelta(minutes=SLOT_MINUTES)
+    for schedule in schedules:
+        for week in range(weeks):
+            current = now + relativedelta(
+                weeks=week,
+                weekday=WEEKDAYS[schedule.day_of_week],
+                hour=schedule.start_time.hour,
+                minute=schedule.start_time.minute,
+                second=0,
+                microsecond=0,
+            )
+            while current.time() < schedule.end_time:
+                yield current, current + slot
+                current += slot
+
+
+def occupied_rows(doctor_ids, start, end, now):
+    """
+    (doctor id, time, hold expiry or None) for every Scheduled appointment,
+    unexpired reservation and paid hold in [start, end), as one UNION query.
+    Paid holds (PAID_STATUSES) are kept past expires_at by the sweeper, so
+    they occupy the slot with no expiry.
+    """
+    appointments = Appointment.objects.filter(
+        doctor_id__in=doctor_ids,
+        status='Scheduled',
+        appointment_date__gte=start,
+        appointment_date__lt=end,
+    ).order_by().annotate(expires=Value(None, output_field=DateTimeField())).values_list(
+        'doctor_id', 'appointment_date', 'expires',
+    )
+    paid = Q(appointment_request__status__in=PAID_STATUSES)
+    reservations = AppointmentReservation.objects.filter(
+        Q(expires_at__gt=now) | paid,
+        doctor_id__in=doctor_ids,
+        appointment_datetime__gte=start,
+        appointment_datetime__lt=end,
+    ).order_by().annotate(
+        expires=Case(When(paid, then=Value(None)), default=F('expires_at'), output_field=DateTimeField()),
+    ).values_list('doctor_id', 'appointment_datetime', 'expires')
+    return appointments.union(reservations, all=True)
+
+
+def busy_times(doctor_ids, start, end, now=None):
+    """{doctor id: sorted UTC datetimes} occupied in [start, end), in one query."""
+    busy = defaultdict(list)
+    for doctor_id, moment, _ in occupied_rows(doctor_ids, start, end, now or timezone.now()):
+        busy[doctor_id].append(moment)
+    for moments in busy.values():
+        moments.sort()
+    return busy
+
+
+def is_occupied(busy, start, end):
+    """Whether any time in the sorted list busy falls in [start, end)."""
+    i = bisect_left(busy, start)
+    return i < len(busy) and busy[i] < end
+
+
+def doctor_availability(doctor, schedules, now=None):
+    """DoctorSchedule's availability list: [{"start", "end", "is_available"}] in UTC."""
+    now = now or timezone.now()
+    slots = [
+        (start.astimezone(pytz.UTC), end.astimezone(pytz.UTC))
+        for start, end in schedule_slots(schedules, pytz.timezone(doctor.timezone), now)
+    ]
+    if not slots:
+        return []
+
+    busy = busy_times([doctor.pk], min(start for start, _ in slots), max(end for _, end in slots), now)[doctor.pk]
+    return [
+        {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "is_available": not is_occupied(busy, start, end),
+        }
+        for start, end in slots
+    ]
+
+
+# --- per-doctor, per-day slot bitmaps ---------------------------------------
+#
+# Bit i of a day's bitmap is the slot starting i * SLOT_MINUTES after local
+# midnight in the doctor's timezone. Busy bitmaps are cached under a
+# per-doctor version that the receivers in appointment.models bump after any
+# appointment, reservation or request write (create, cancel, pay, delete); an
+# entry holding an unpaid reservation is also only valid until that
+# reservation expires, so expiry needs no write at all.
+
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+BITMAP_CACHE_TIMEOUT = 60 * 60 * 24
+MAX_RANGE_DAYS = 31
+
+
+def _version_key(doctor_id):
+    return f"availability:version:{doctor_id}"
+
+
+def _bitmap_key(doctor_id, version, day):
+    return f"availability:busy:{doctor_id}:{version}:{day.isoformat()}"
+
+
+def _doctor_versions(doctor_ids):
+    keys = {doctor_id: _version_key(doctor_id) for doctor_id in doctor_ids}
+    stored = cache.get_many(keys.values())
+    versions = {}
+    for doctor_id, key in keys.items():
+        if key not in stored:
+            # seeded from the clock so an evicted version never comes back
+            # with a value an old bitmap was stored under
+            cache.add(key, int(time.time() * 1000), BITMAP_CACHE_TIMEOUT)
+            stored[key] = cache.get(key) or 0
+        versions[doctor_id] = stored[key]
+    return versions
+
+
+def bump_doctor_version(doctor_id):
+    key = _version_key(doctor_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), BITMAP_CACHE_TIMEOUT)
+
+
+def doctor_slots_changed(doctor_id):
+    """Retire the doctor's cached bitmaps once the current transaction commits."""
+    if doctor_id:
+        transaction.on_commit(lambda: bump_doctor_version(doctor_id))
+
+
+def slot_bit(moment, doctor_tz):
+    """(local day, bit index) of the slot containing moment."""
+    local = moment.astimezone(doctor_tz)
+    return local.date(), (local.hour * 60 + local.minute) // SLOT_MINUTES
+
+
+def _day_bounds(day, doctor_tz):
+    start = doctor_tz.localize(datetime.combine(day, dt_time.min))
+    end = doctor_tz.localize(datetime.combine(day + timedelta(days=1), dt_time.min))
+    return start.astimezone(pytz.UTC), end.astimezone(pytz.UTC)
+
+
+def _compute_busy(doctors, days, now):
+    """{(doctor id, day): (bitmap, valid until or None)} from one query for all doctors."""
+    zones = {doctor.pk: pytz.timezone(doctor.timezone) for doctor in doctors}
+    start = min(_day_bounds(days[0], tz)[0] for tz in zones.values())
+    end = max(_day_bounds(days[-1], tz)[1] for tz in zones.values())
+
+    bitmaps = {(doctor_id, day): [0, None] for doctor_id in zones for day in days}
+    for doctor_id, moment, expires in occupied_rows(list(zones), start, end, now):
+        day, bit = slot_bit(moment, zones[doctor_id])
+        entry = bitmaps.get((doctor_id, day))
+        if entry is None:
+            continue
+        entry[0] |= 1 << bit
+        if expires is not None and (entry[1] is None or expires < entry[1]):
+            entry[1] = expires
+    return {key: tuple(entry) for key, entry in bitmaps.items()}
+
+
+def busy_bitmaps(doctors, days, now=None):
+    """
+    {(doctor id, day): busy bitmap} for every doctor and day (days sorted),
+    from cache where still valid; the rest is computed with one query.
+    """
+    now = now or timezone.now()
+    versions = _doctor_versions([doctor.pk for doctor in doctors])
+    keys = {
+        (doctor.pk, day): _bitmap_key(doctor.pk, versions[doctor.pk], day)
+        for doctor in doctors for day in days
+    }
+    cached = cache.get_many(keys.values())
+
+    bitmaps, missing = {}, set()
+    for slot_key, key in keys.items():
+        entry = cached.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= now):
+            missing.add(slot_key)
+        else:
+            bitmaps[slot_key] = entry[0]
+
+    if missing:
+        missing_doctors = [doctor for doctor in doctors if any(key[0] == doctor.pk for key in missing)]
+        missing_days = sorted({day for _, day in missing})
+        computed = _compute_busy(missing_doctors, missing_days, now)
+        cache.set_many(
+            {keys[slot_key]: entry for slot_key, entry in computed.items() if slot_key in keys},
+            BITMAP_CACHE_TIMEOUT,
+        )
+        bitmaps.update({slot_key: entry[0] for slot_key, entry in computed.items() if slot_key in keys})
+    return bitmaps
+
+
+def schedule_bitmaps(schedules):
+    """{(doctor id, weekday name): bitmap of slots fully inside a schedule}."""
+    masks = defaultdict(int)
+    for schedule in schedules:
+        start = schedule.start_time.hour * 60 + schedule.start_time.minute
+        end = schedule.end_time.hour * 60 + schedule.end_time.minute
+        first = -(-start // SLOT_MINUTES)
+        for bit in range(first, end // SLOT_MINUTES):
+            masks[(schedule.doctor_id, schedule.day_of_week)] |= 1 << bit
+    return masks
+
+
+def window_bitmap(start_time=None, end_time=None):
+    """Bitmap of the slots lying within [start_time, end_time) of a local day."""
+    first = 0
+    if start_time:
+        first = -(-(start_time.hour * 60 + start_time.minute) // SLOT_MINUTES)
+    last = SLOTS_PER_DAY
+    if end_time:
+        last = (end_time.hour * 60 + end_time.minute) // SLOT_MINUTES
+    return sum(1 << bit for bit in range(first, last))
+
+
+def open_slots(doctor, day, free, now):
+    """UTC start times of the set bits of free on day, skipping slots already started."""
+    doctor_tz = pytz.timezone(doctor.timezone)
+    midnight = doctor_tz.localize(datetime.combine(day, dt_time.min))
+    slots = []
+    for bit in range(SLOTS_PER_DAY):
+        if free >> bit & 1:
+            start = doctor_tz.normalize(midnight + timedelta(minutes=bit * SLOT_MINUTES))
+            if start > now:
+                slots.append(start.astimezone(pytz.UTC))
+    return slots
+
+
+def free_bitmaps(doctors, start_day, end_day, now=None, window=None):
+    """
+    {(doctor id, day): bitmap of scheduled, unoccupied slots} over
+    [start_day, end_day], optionally masked by window (see window_bitmap).
+    """
+    days = [start_day + timedelta(days=n) for n in range((end_day - start_day).days + 1)]
+    if not doctors or not days:
+        return {}
+    schedules = schedule_bitmaps(Schedule.objects.filter(doctor__in=doctors))
+    busy = busy_bitmaps(doctors, days, now)
+    mask = window if window is not None else (1 << SLOTS_PER_DAY) - 1
+    return {
+        (doctor.pk, day): schedules.get((doctor.pk, day.strftime('%A')), 0) & ~busy[(doctor.pk, day)] & mask
+        for doctor in doctors for day in days
+    }
+
+
+def _doctor_info(doctor):
+    return {
+        "doctor_id": doctor.user.id,
+        "doctor_name": doctor.user.get_full_name(),
+        "specialization": doctor.specialization,
+        "timezone": doctor.timezone,
+    }
+
+
+def doctors_open_slots(doctors, start_day, end_day, now=None):
+    """
+    [{"doctor_id", "doctor_name", "specialization", "timezone", "days": [{"date", "slots"}]}]
+    for doctors (with user loaded) over [start_day, end_day].
+    """
+    now = now or timezone.now()
+    free = free_bitmaps(doctors, start_day, end_day, now)
+    days = sorted({day for _, day in free})
+
+    results = []
+    for doctor in doctors:
+        doctor_days = []
+        for day in days:
+            bitmap = free[(doctor.pk, day)]
+            slots = open_slots(doctor, day, bitmap, now) if bitmap else []
+            if slots:
+                doctor_days.append({"date": day.isoformat(), "slots": [slot.isoformat() for slot in slots]})
+        results.append({**_doctor_info(doctor), "days": doctor_days})
+    return results
+
+
+def search_open_slots(doctors, start_day, end_day, window=None, limit=50, now=None):
+    """
+    Open slots across doctors, ranked soonest first; at the same time the
+    doctor with more free slots that day (the less booked one) comes first.
+    [{"start", "end", "doctor_id", "doctor_name", "specialization", "timezone"}]
+    """
+    now = now or timezone.now()
+    free = free_bitmaps(doctors, start_day, end_day, now, window)
+    by_id = {doctor.pk: doctor for doctor in doctors}
+
+    candidates = []
+    for (doctor_id, day), bitmap in free.items():
+        if not bitmap:
+            continue
+        doctor = by_id[doctor_id]
+        openings = bin(bitmap).count("1")
+        for start in open_slots(doctor, day, bitmap, now):
+            candidates.append((start, -openings, doctor.user.get_full_name(), doctor))
+    candidates.sort(key=lambda candidate: candidate[:3])
+
+    return [
+        {
+            "start": start.isoformat(),
+            "end": (start + timedelta(minutes=SLOT_MINUTES)).isoformat(),
+            **_doctor_info(doctor),
+        }
+        for start, _, _, doctor in candidates[:limit]
+    ]
+
+
+def slot_is_busy(doctor, moment, now=None):
+    """Whether the slot containing moment is booked or held (cached bitmap)."""
+    day, bit = slot_bit(moment, pytz.timezone(doctor.timezone))
+    return bool(busy_bitmaps([doctor], [day], now)[(doctor.pk, day)] >> bit & 1)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from appointment.sweeper import SWEEP_BATCH_SIZE, sweep_expired_reservations
+
+class Command(BaseCommand):
+    help = 'Expire unpaid appointment requests whose reservation hold has lapsed and free their slots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE, help='Reservations per transaction')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, sweeping every INTERVAL seconds (default: sweep once and exit)')
+
+    def handle(self, *args, **kwargs):
+        while True:
+            result = sweep_expired_reservations(batch_size=kwargs['batch_size'])
+            self.stdout.write(
+                f"swept={result['swept']} requests_expired={result['requests_expired']} "
+                f"payments_failed={result['payments_failed']} batches={result['batches']} "
+                f"max_lag={result['max_lag_seconds']:.0f}s duration={result['duration_ms']}ms"
+            )
+            if kwargs['interval'] <= 0:
+                break
+            time.sleep(kwargs['interval'])
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointment', '0009_alter_appointment_appointment_type'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointmentreservation',
+            index=models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ),
+    ]
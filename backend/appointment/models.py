@@ -1,10 +1,15 @@
 from datetime import timedelta
 from django.utils import timezone
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from patient.models import Patient
 from user.models import Doctor
 
 HOLD_MINUTES = 10 
+# a reservation for a request in one of these states keeps its slot past
+# expires_at: the patient has paid for it (the secretary confirms or refunds)
+PAID_STATUSES = ('paid', 'reserved', 'paid_unavailable')
 from django.conf import settings
 class Appointment(models.Model):
     APPOINTMENT_TYPES = (
@@ -43,6 +48,10 @@ class Appointment(models.Model):
                 name='unique_appointment_per_doctor_and_slot'
             )
         ]
+        indexes = [
+            # day listings (UpcomingAppointments) and availability read Scheduled rows by date range
+            models.Index(fields=['status', 'appointment_date'], name='appointment_status_date_idx'),
+        ]
 
     def __str__(self):
         return f"Appointment {self.id} on {self.appointment_date} with {self.scheduled_by} for {self.patient}"
@@ -93,6 +102,10 @@ class AppointmentReservation(models.Model):
                 name='unique_reserved_slot_per_doctor'
             )
         ]
+        indexes = [
+            # the expiry sweeper (appointment.sweeper) walks holds in expiry order
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
         ordering = ['expires_at']
     
     def is_expired(self):
@@ -202,4 +215,17 @@ class AppointmentReferral(models.Model):
     appointment = models.OneToOneField(Appointment, null=True, blank=True, on_delete=models.SET_NULL, related_name='referral')
     
     def __str__(self):
-        return f"Referral from {self.referring_doctor} to {self.receiving_doctor or 'Unassigned'} for {self.patient}"
\ No newline at end of file
+        return f"Referral from {self.referring_doctor} to {self.receiving_doctor or 'Unassigned'} for {self.patient}"
+
+
+# cached availability bitmaps (appointment.availability): any booking, hold,
+# cancellation or removal changes the doctor's occupied slots
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=AppointmentReservation)
+@receiver(post_delete, sender=AppointmentReservation)
+# a request's status decides whether its expired hold still blocks the slot
+@receiver(post_save, sender=AppointmentRequest)
+def refresh_doctor_slots(sender, instance, **kwargs):
+    from .availability import doctor_slots_changed
+    doctor_slots_changed(instance.doctor_id)
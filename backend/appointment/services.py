@@ -2,12 +2,18 @@
 import base64
 import logging
 import requests
+import requests.adapters
 from typing import Optional, Dict, Any
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_TIMEOUT = 30  # seconds
+STATUS_TIMEOUT = 10  # seconds; status checks run while the patient waits on the page
+
+# one keep-alive session per process so repeated status checks reuse the TLS connection
+_session = requests.Session()
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=20))
 
 class PayMayaService:
     """
@@ -276,7 +282,7 @@ class PayMayaService:
             }
 
             logger.info(f"📤 Sending PayMaya request to: {url}")
-            resp = requests.post(url, json=payload, headers=headers, timeout=DEFAULT_TIMEOUT)
+            resp = _session.post(url, json=payload, headers=headers, timeout=DEFAULT_TIMEOUT)
             
             # Enhanced logging
             logger.info(f"📥 PayMaya Response: {resp.status_code}")
@@ -333,7 +339,7 @@ class PayMayaService:
             }
             
             logger.info(f"Checking payment status for checkout: {checkout_id}")
-            resp = requests.get(url, headers=headers, timeout=DEFAULT_TIMEOUT)
+            resp = _session.get(url, headers=headers, timeout=STATUS_TIMEOUT)
 
             if not resp.ok:
                 logger.error("PayMaya get_payment_status failed: %s %s", resp.status_code, resp.text)
@@ -399,7 +405,7 @@ class PayMayaService:
                 "Authorization": PayMayaService._get_basic_auth_header(use_public_key=True),
             }
             
-            resp = requests.get(url, headers=headers, timeout=30)
+            resp = _session.get(url, headers=headers, timeout=STATUS_TIMEOUT)
             if resp.status_code == 200:
                 checkout_data = resp.json()
                 logger.info(f"Checkout details: {checkout_data}")
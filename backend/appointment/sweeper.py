@@ -0,0 +1,129 @@
+"""
+Expired reservation sweeper.
+
+A reservation holds its slot (unique_reserved_slot_per_doctor) until it is
+deleted, but nothing deleted expired ones. sweep_expired_reservations()
+walks reservations with expires_at <= now in expires_at order, SWEEP_BATCH_SIZE
+at a time, each batch in its own transaction with SKIP LOCKED so several
+sweepers (or a sweeper and a request) never block each other:
+
+  - unpaid requests (pending_payment) become 'expired' and their Pending
+    payments 'Failed'
+  - the reservations are deleted, freeing the slots
+  - requests already paid (models.PAID_STATUSES) keep their hold (the slot
+    was paid for; the secretary confirms or refunds it), and availability
+    keeps counting it as occupied
+
+Run it from cron with `manage.py sweep_reservations`, as a long-running
+process with `--interval`, or in the web process by setting
+RESERVATION_SWEEP_INTERVAL (see start_sweeper, wired up in backend.asgi).
+"""
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import PAID_STATUSES, AppointmentRequest, AppointmentReservation, Payment
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 500
+LAST_SWEEP_KEY = "appointment:sweeper:last"
+
+
+def _sweep_batch(now, batch_size):
+    """Sweep one batch; returns (reservations, requests expired, payments failed, oldest expires_at)."""
+    with transaction.atomic():
+        rows = list(
+            AppointmentReservation.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .filter(expires_at__lte=now)
+            .exclude(appointment_request__status__in=PAID_STATUSES)
+            .order_by('expires_at')
+            .values_list('id', 'appointment_request_id', 'expires_at')[:batch_size]
+        )
+        if not rows:
+            return 0, 0, 0, None
+
+        request_ids = [request_id for _, request_id, _ in rows]
+        expired = AppointmentRequest.objects.filter(
+            id__in=request_ids, status='pending_payment'
+        ).update(status='expired', updated_at=now)
+        failed = Payment.objects.filter(
+            appointment_request_id__in=request_ids, status='Pending'
+        ).update(status='Failed', updated_at=now)
+        # a queryset delete, so the availability receivers still see each row
+        AppointmentReservation.objects.filter(id__in=[pk for pk, _, _ in rows]).delete()
+    return len(rows), expired, failed, rows[0][2]
+
+
+def sweep_expired_reservations(now=None, batch_size=SWEEP_BATCH_SIZE, max_batches=None):
+    """
+    Sweep every reservation expired at `now`. Returns the run's metrics:
+    swept, requests_expired, payments_failed, batches, max_lag_seconds (how
+    long the oldest swept hold had been expired) and duration_ms.
+    """
+    now = now or timezone.now()
+    started = time.monotonic()
+    result = {"swept": 0, "requests_expired": 0, "payments_failed": 0, "batches": 0, "max_lag_seconds": 0.0}
+
+    while max_batches is None or result["batches"] < max_batches:
+        swept, expired, failed, oldest = _sweep_batch(now, batch_size)
+        if not swept:
+            break
+        result["batches"] += 1
+        result["swept"] += swept
+        result["requests_expired"] += expired
+        result["payments_failed"] += failed
+        result["max_lag_seconds"] = max(result["max_lag_seconds"], (now - oldest).total_seconds())
+        if swept < batch_size:
+            break
+
+    result["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    result["finished_at"] = timezone.now().isoformat()
+    cache.set(LAST_SWEEP_KEY, result, None)
+    if result["swept"]:
+        logger.info(
+            "Swept %d expired reservations in %d batches (max lag %.0fs, %.0f ms)",
+            result["swept"], result["batches"], result["max_lag_seconds"], result["duration_ms"],
+        )
+    return result
+
+
+def last_sweep():
+    """Metrics of the most recent sweep by any process, or None."""
+    return cache.get(LAST_SWEEP_KEY)
+
+
+def _sweep_once():
+    try:
+        return sweep_expired_reservations()
+    finally:
+        close_old_connections()
+
+
+async def sweeper_loop(interval):
+    """Sweep every `interval` seconds on the running event loop, off the loop's thread."""
+    while True:
+        try:
+            await sync_to_async(_sweep_once, thread_sensitive=False)()
+        except Exception:
+            logger.exception("Reservation sweep failed")
+        await asyncio.sleep(interval)
+
+
+_task = None
+
+
+def start_sweeper():
+    """Start sweeper_loop on the current event loop once, if RESERVATION_SWEEP_INTERVAL > 0."""
+    global _task
+    interval = getattr(settings, "RESERVATION_SWEEP_INTERVAL", 0)
+    if interval <= 0 or (_task is not None and not _task.done()):
+        return
+    _task = asyncio.get_running_loop().create_task(sweeper_loop(interval))
@@ -13,6 +13,8 @@ urlpatterns = [
     path('appointment-referral/', views.DoctorCreateReferralView.as_view(), name='referral'),
     path('appointment-referral-list/', views.ReferralViewList.as_view(), name='referral-list'),
     path('appointment/doctor-schedule/<str:doctor_id>/', views.DoctorSchedule.as_view(), name='doctor-schedule'),
+    path('appointment/doctors-availability/', views.DoctorsAvailabilityView.as_view(), name='doctors-availability'),
+    path('appointment/availability/search/', views.AvailabilitySearchView.as_view(), name='availability-search'),
     path('appointment/schedule-appointment/', views.ScheduleAppointment.as_view(), name='schedule-appointment'),
     path('appointment/upcoming-appointments/', views.UpcomingAppointments.as_view(), name='upcoming-appointment'),
     path('queue/debug/', views.QueueDebugMonthView.as_view(), name='queue-debug'),
@@ -2,8 +2,12 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, viewsets
 from django.utils.dateparse import parse_datetime
+import re
 
 from .services import PayMayaService
+from .availability import (
+    MAX_RANGE_DAYS, doctor_availability, doctors_open_slots, search_open_slots, slot_is_busy, window_bitmap,
+)
 
 from .models import HOLD_MINUTES, AppointmentReferral, AppointmentRequest, AppointmentReservation
 from patient.models import Patient
@@ -13,7 +17,7 @@ from user.permissions import IsDoctorOrOnCallDoctor, isDoctor, isSecretary
 from django.utils import timezone
 from datetime import date
 from django.utils.timezone import now, localtime
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time as dt_time
 from .models import Appointment
 
 from user.models import Doctor, UserAccount, Schedule
@@ -26,12 +30,9 @@ from django.db.models import Q
 from patient.serializers import PatientSerializer
 from django.db import IntegrityError
 import pytz
-from dateutil.relativedelta import relativedelta  # <-- Add this
-from dateutil.relativedelta import MO, TU, WE, TH, FR, SA, SU
-from django.db.models import Max
 from .serializers import AppointmentSerializer, QueueSerializer
-from queueing.models import TemporaryStorageQueue
-from django.db.models import F
+from queueing.models import QueueCounter, TemporaryStorageQueue
+from queueing.positions import ensure_positions, next_position, position_after
 from django.db import transaction
 import pytz
 
@@ -72,53 +73,15 @@ class DoctorSchedule(APIView):
     def get(self, request, doctor_id):
         try:
             # Step 1: Get UserAccount (using the provided user ID)
-            user = UserAccount.objects.get(id=doctor_id, role__in=['doctor', 'on-call-doctor'])
+            user = UserAccount.objects.select_related('doctor_profile').get(
+                id=doctor_id, role__in=['doctor', 'on-call-doctor']
+            )
             doctor = user.doctor_profile  # Access the related Doctor instance
             schedules = Schedule.objects.filter(doctor=doctor)
-            
-            # Step 4: Generate availability slots based on the schedules
-            availability = []
-            doctor_tz = pytz.timezone(doctor.timezone)
-            now = timezone.now().astimezone(doctor_tz)
-
-            for schedule in schedules:
-                # For each scheduled day (e.g., Tuesday), generate slots for the next 12 weeks
-                day_name = schedule.day_of_week
-                start_time = schedule.start_time
-                end_time = schedule.end_time
-
-                # Generate slots for this day for the next 12 weeks
-                for week in range(12):
-                    # Find the next occurrence of this day (e.g., Tuesday)
-                    next_day = now + relativedelta(
-                        weeks=week, 
-                        weekday=day_to_weekday(day_name),  # Helper function
-                        hour=start_time.hour,
-                        minute=start_time.minute,
-                        second=0,
-                        microsecond=0
-                    )
-                    
-                    # Generate time slots for this day
-                    current_slot = next_day
-                    while current_slot.time() < end_time:
-                        slot_end = current_slot + timedelta(minutes=30)
-                        
-                        # Check if slot is available
-                        is_available = not Appointment.objects.filter(
-                            doctor=doctor,
-                            appointment_date__gte=current_slot.astimezone(pytz.UTC),
-                            appointment_date__lt=slot_end.astimezone(pytz.UTC),
-                            status='Scheduled'
-                        ).exists()
-                        
-                        availability.append({
-                            "start": current_slot.astimezone(pytz.UTC).isoformat(),
-                            "end": slot_end.astimezone(pytz.UTC).isoformat(),
-                            "is_available": is_available
-                        })
-                        
-                        current_slot = slot_end
+
+            # Step 2: 30-minute slots for the next 12 weeks, checked against all
+            # booked / held times in the window (one query, see availability.py)
+            availability = doctor_availability(doctor, schedules)
 
             return Response({
                 "doctor_id": user.id,
@@ -133,17 +96,119 @@ class DoctorSchedule(APIView):
         except Doctor.DoesNotExist:
             return Response({"error": "Doctor profile not found"}, status=404)
     
-def day_to_weekday(day_name):
-    return {
-        'Monday': MO(-1),
-        'Tuesday': TU(-1),
-        'Wednesday': WE(-1),
-        'Thursday': TH(-1),
-        'Friday': FR(-1),
-        'Saturday': SA(-1),
-        'Sunday': SU(-1)
-    }[day_name]    
-        
+def availability_range(params):
+    """(start, end) days from ?start=&end= (today and a week on by default); ValueError if invalid."""
+    try:
+        start_day = date.fromisoformat(params["start"]) if params.get("start") else timezone.localdate()
+        end_day = date.fromisoformat(params["end"]) if params.get("end") else start_day + timedelta(days=6)
+    except ValueError:
+        raise ValueError("start and end must be YYYY-MM-DD dates")
+    if end_day < start_day:
+        raise ValueError("end must not be before start")
+    if (end_day - start_day).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"A range may span at most {MAX_RANGE_DAYS} days")
+    return start_day, end_day
+
+
+# user ids are "<last name slug>-<hex>" (see user.models.create_user_id)
+USER_ID_PATTERN = re.compile(r"[\w-]{1,64}", re.ASCII)
+MAX_DOCTOR_IDS = 50
+
+
+def doctor_id_list(value):
+    """User ids from a comma-separated ?doctors= value; ValueError if one is not a user id."""
+    doctor_ids = list(dict.fromkeys(i.strip() for i in (value or "").split(",") if i.strip()))
+    if len(doctor_ids) > MAX_DOCTOR_IDS:
+        raise ValueError(f"At most {MAX_DOCTOR_IDS} doctors may be requested at once")
+    invalid = [i for i in doctor_ids if not USER_ID_PATTERN.fullmatch(i)]
+    if invalid:
+        raise ValueError(f"Invalid doctor id: {invalid[0][:64]}")
+    return doctor_ids
+
+
+def bookable_doctors():
+    return Doctor.objects.select_related('user').filter(
+        user__role__in=['doctor', 'on-call-doctor'], user__is_active=True
+    ).order_by('user__last_name', 'user__first_name')
+
+
+class DoctorsAvailabilityView(APIView):
+    """
+    Open 30-minute slots for several doctors over a date range:
+    ?doctors=<user id>,<user id>&start=YYYY-MM-DD&end=YYYY-MM-DD
+    (doctors defaults to every doctor, start to today, end to a week on).
+    """
+    permission_classes = [PatientMedicalStaff]
+
+    def get(self, request):
+        try:
+            start_day, end_day = availability_range(request.query_params)
+            doctor_ids = doctor_id_list(request.query_params.get("doctors"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        doctors = bookable_doctors()
+        if doctor_ids:
+            doctors = list(doctors.filter(user_id__in=doctor_ids))
+            unknown = set(doctor_ids) - {doctor.user_id for doctor in doctors}
+            if unknown:
+                return Response({"error": f"Unknown doctor: {sorted(unknown)[0]}"}, status=400)
+
+        try:
+            return Response({
+                "start": start_day.isoformat(),
+                "end": end_day.isoformat(),
+                "doctors": doctors_open_slots(list(doctors), start_day, end_day),
+            })
+        except Exception as e:
+            return Response({"error": str(e)}, status=500)
+
+
+SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 200
+
+class AvailabilitySearchView(APIView):
+    """
+    Ranked open slots across doctors:
+    ?specialization=Cardiology&start=YYYY-MM-DD&end=YYYY-MM-DD&from=HH:MM&to=HH:MM&limit=N
+    Soonest first; at equal times the less booked doctor first.
+    """
+    permission_classes = [PatientMedicalStaff]
+
+    def get(self, request):
+        try:
+            start_day, end_day = availability_range(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        from_raw = request.query_params.get("from")
+        to_raw = request.query_params.get("to")
+        try:
+            from_time = dt_time.fromisoformat(from_raw) if from_raw else None
+            to_time = dt_time.fromisoformat(to_raw) if to_raw else None
+            limit = max(1, min(int(request.query_params.get("limit", SEARCH_LIMIT)), MAX_SEARCH_LIMIT))
+        except ValueError:
+            return Response({"error": "from and to must be HH:MM times and limit a number"}, status=400)
+
+        doctors = bookable_doctors()
+        specialization = (request.query_params.get("specialization") or "").strip()
+        if specialization:
+            doctors = doctors.filter(specialization__iexact=specialization)
+
+        try:
+            slots = search_open_slots(
+                list(doctors), start_day, end_day, window_bitmap(from_time, to_time), limit,
+            )
+            return Response({
+                "specialization": specialization or None,
+                "start": start_day.isoformat(),
+                "end": end_day.isoformat(),
+                "count": len(slots),
+                "slots": slots,
+            })
+        except Exception as e:
+            return Response({"error": str(e)}, status=500)
+
 class ScheduleAppointment(APIView):
     permission_classes = [isSecretary]
 
@@ -203,15 +268,9 @@ class ScheduleAppointment(APIView):
         if not schedule_exists:
             return Response({"error": "Doctor not available at this time"}, status=400)
 
-        # Check for conflicts using calculated end time
-        calculated_end_utc = appointment_date_utc + timedelta(minutes=30)
-        conflict = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date__lt=calculated_end_utc,
-            appointment_date__gte=appointment_date_utc - timedelta(minutes=29)  # 1-minute buffer
-        ).exists()
-
-        if conflict:
+        # Check for conflicts against the cached slot bitmap: Scheduled appointments
+        # and held reservations; the unique constraint below still decides races
+        if slot_is_busy(doctor, appointment_date_utc):
             return Response({"error": "Time slot is already booked"}, status=status.HTTP_409_CONFLICT)
 
         # Create appointment
@@ -625,7 +684,7 @@ class AppointmentReferralViewSet(viewsets.ModelViewSet):
         return Response(result)
     
 from django.utils import timezone
-from datetime import datetime, time
+from datetime import datetime, time, timezone as dt_timezone
 from zoneinfo import ZoneInfo
 
 MANILA = ZoneInfo("Asia/Manila")
@@ -636,72 +695,34 @@ class UpcomingAppointments(APIView):
     def get(self, request):
         user = request.user
 
-        # Get current Manila time
-        now_manila = timezone.now().astimezone(MANILA)
-        date_today_manila = now_manila.date()
-
-        # Manila start/end of day
-        start_of_day_manila = datetime.combine(date_today_manila, time.min).replace(tzinfo=MANILA)
-        end_of_day_manila = datetime.combine(date_today_manila, time.max).replace(tzinfo=MANILA)
-
-        # Debug prints
-        print("now_manila:", now_manila)
-        print("date_today_manila:", date_today_manila)
-        print("start_of_day_manila:", start_of_day_manila)
-        print("end_of_day_manila:", end_of_day_manila)
+        # today in Manila, as UTC bounds, so the (status, appointment_date)
+        # index serves the range instead of every Scheduled row being read
+        date_today_manila = timezone.now().astimezone(MANILA).date()
+        start_of_day = datetime.combine(date_today_manila, time.min, tzinfo=MANILA)
+        end_of_day = datetime.combine(date_today_manila + timedelta(days=1), time.min, tzinfo=MANILA)
 
-        # Get all scheduled appointments and filter by Manila date in Python
-        all_appointments = Appointment.objects.filter(status="Scheduled")
-        
-        # Filter appointments where the Manila date matches today
-        appointments_today = []
-        for apt in all_appointments:
-            # Convert appointment UTC time to Manila time
-            apt_manila_time = apt.appointment_date.astimezone(MANILA)
-            print(f"Checking appointment {apt.id}: UTC: {apt.appointment_date} -> Manila: {apt_manila_time}")
-            
-            # Check if it falls within today's Manila date
-            if start_of_day_manila <= apt_manila_time <= end_of_day_manila:
-                appointments_today.append(apt)
-                print(f"-> INCLUDED in today's appointments")
+        appointments_today = Appointment.objects.filter(
+            status="Scheduled",
+            appointment_date__gte=start_of_day.astimezone(dt_timezone.utc),
+            appointment_date__lt=end_of_day.astimezone(dt_timezone.utc),
+        ).select_related(
+            'patient__user', 'doctor__user', 'scheduled_by', 'referral__referring_doctor',
+        )
 
         # Apply role-based filtering
         role = getattr(request.user, "role", None)
         if role == 'secretary':
-            # Already have the filtered list
             pass
         elif role in ('doctor', 'on-call-doctor'):
-            doctor = Doctor.objects.filter(user=request.user).first()
-            appointments_today = [apt for apt in appointments_today if apt.doctor == doctor]
+            appointments_today = appointments_today.filter(doctor__user=user)
         elif role == 'patient':
-            appointments_today = [apt for apt in appointments_today if apt.patient.user == user]
+            appointments_today = appointments_today.filter(patient__user=user)
         else:
-            appointments_today = []
-
-        print(f"Final appointments today: {len(appointments_today)}")
+            appointments_today = appointments_today.none()
 
         serializer = AppointmentSerializer(appointments_today, many=True)
         return Response(serializer.data)
 
-def ensure_positions_initialized_for_date(queue_date):
-    """
-    Ensure every TemporaryStorageQueue for queue_date has a sequential non-zero position.
-    Positions will be assigned as 1..N in ascending order of queue_number if any position <= 0.
-    """
-    qs = TemporaryStorageQueue.objects.filter(queue_date=queue_date).order_by('queue_number')
-    # Initialization needed if any position is <= 0 or missing
-    if qs.filter(position__lte=0).exists():
-        with transaction.atomic():
-            locked = TemporaryStorageQueue.objects.select_for_update().filter(
-                queue_date=queue_date
-            ).order_by('queue_number')
-            pos = 1
-            for entry in locked:
-                if entry.position != pos:
-                    entry.position = pos
-                    entry.save(update_fields=['position'])
-                pos += 1
-
 def _patient_identifier(patient):
     """Return a safe scalar identifier for a patient instance."""
     if patient is None:
@@ -759,26 +780,20 @@ class AcceptAppointmentView(APIView):
 
         complaint_text = appointment.notes or "Appointment"
 
-        ensure_positions_initialized_for_date(today)
+        ensure_positions(today)
 
         with transaction.atomic():
-            # Lock today's active rows
-            current_qs = TemporaryStorageQueue.objects.select_for_update().filter(
+            new_queue_number = QueueCounter.allocate(today)
+
+            # Slot in right after the patient currently being served; only the new row is written
+            first_entry = TemporaryStorageQueue.objects.filter(
                 queue_date=today
-            ).exclude(status__in=['Completed', 'Cancelled']).order_by('position', 'queue_number')
-            max_q = current_qs.aggregate(Max('queue_number'))['queue_number__max'] or 0
-            new_queue_number = max_q + 1
-
-            if current_qs.exists():
-                first_entry = current_qs.first()
-
-                TemporaryStorageQueue.objects.filter(
-                    queue_date=today,
-                    position__gt=first_entry.position
-                ).update(position=F('position') + 1)
-                new_position = first_entry.position + 1
+            ).exclude(status__in=['Completed', 'Cancelled']).order_by('position', 'queue_number').first()
+
+            if first_entry:
+                new_position = position_after(first_entry)
             else:
-                new_position = 1
+                new_position = next_position(today)
             queue_entry = TemporaryStorageQueue.objects.create(
                 patient=appointment.patient,
                 priority_level=priority_level,
@@ -1008,7 +1023,12 @@ class BookAppointmentAPIView(APIView):
                     'error': 'Doctor not found'
                 }, status=status.HTTP_404_NOT_FOUND)
             
-            
+            # cheap check against the cached slot bitmap before creating anything;
+            # the unique reservation constraint below still decides races
+            if slot_is_busy(doctor, appt_dt):
+                return Response({'error': 'This time slot was just taken. Please choose another time.'},
+                                status=status.HTTP_409_CONFLICT)
+
             try:
                 with transaction.atomic():
                     appt_request = AppointmentRequest.objects.create(
@@ -12,9 +12,19 @@ django.setup()
 
 # Import routing AFTER Django setup
 from queueing import routing
+from appointment.sweeper import start_sweeper
+
+django_asgi_app = get_asgi_application()
+
+
+async def http_application(scope, receive, send):
+    # the optional reservation sweeper runs on the server's event loop
+    start_sweeper()
+    await django_asgi_app(scope, receive, send)
+
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": http_application,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             routing.websocket_urlpatterns
@@ -0,0 +1,205 @@
+"""
+In-process prefix index for type-ahead lookups.
+
+Entries are kept as a sorted array of (normalized key, id) pairs; a prefix
+query is a bisect plus a short forward scan, so keystrokes never reach the
+database. The index is loaded on the first query (one request builds it, any
+concurrent ones wait for that build), kept current by put()/discard() from
+model signals, and reloaded every AUTOCOMPLETE_REFRESH_SECONDS to pick up
+writes made outside this process (other workers, Supabase inserts). Reloads
+run in a background thread while queries keep reading the previous index.
+"""
+import bisect
+import logging
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+
+
+def parse_limit(value):
+    """The ?limit= of an autocomplete request, clamped to 1..MAX_LIMIT (ValueError if not a number)."""
+    if value in (None, ""):
+        return DEFAULT_LIMIT
+    return max(1, min(int(value), MAX_LIMIT))
+
+
+def normalize(text):
+    """Case- and accent-insensitive form of text with whitespace collapsed."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.casefold().split())
+
+
+class PrefixIndex:
+    """
+    load() returns an iterable of (id, keys, payload). Every key of an entry is
+    searchable; a query returns each matching entry's payload once.
+    """
+
+    def __init__(self, load, refresh_seconds=None):
+        self._load = load
+        self._refresh_seconds = refresh_seconds
+        # guards _keys / _entries / _built_at / _pending
+        self._lock = threading.Lock()
+        # held by whichever thread is loading, so only one load runs at a time
+        self._build_lock = threading.Lock()
+        self._keys = []
+        self._entries = {}
+        self._built_at = None
+        # put() / discard() calls made while a load runs, replayed onto its result
+        self._pending = None
+
+    @property
+    def refresh_seconds(self):
+        if self._refresh_seconds is not None:
+            return self._refresh_seconds
+        return getattr(settings, "AUTOCOMPLETE_REFRESH_SECONDS", 300)
+
+    def rebuild(self):
+        """Reload every entry; returns once a load (this one or a concurrent one) has finished."""
+        if not self._build_lock.acquire(blocking=False):
+            # another thread is loading: wait for it rather than loading twice
+            with self._build_lock:
+                return
+        try:
+            self._collect_pending()
+            self._rebuild_locked()
+        finally:
+            self._build_lock.release()
+
+    def _collect_pending(self):
+        with self._lock:
+            self._pending = []
+
+    def _rebuild_locked(self):
+        try:
+            entries = {}
+            for entry_id, keys, payload in self._load():
+                entries[entry_id] = (self._normalized(keys), payload)
+            sorted_keys = sorted(
+                (key, entry_id) for entry_id, (keys, _) in entries.items() for key in keys
+            )
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._entries = entries
+            self._keys = sorted_keys
+            self._built_at = time.monotonic()
+            # signal writes that landed after the load read their rows
+            for change in pending:
+                change()
+
+    def _refresh_in_background(self):
+        if not self._build_lock.acquire(blocking=False):
+            return
+        # from now on, so signal writes made before the thread gets going are kept too
+        self._collect_pending()
+        thread = threading.Thread(target=self._background_refresh, daemon=True)
+        try:
+            thread.start()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            self._build_lock.release()
+            raise
+
+    def _background_refresh(self):
+        try:
+            self._rebuild_locked()
+        except Exception:
+            logger.exception("Autocomplete index refresh failed")
+            with self._lock:
+                # try again on a later query instead of on every one
+                self._built_at = time.monotonic()
+        finally:
+            connection.close()
+            self._build_lock.release()
+
+    def _ensure_built(self):
+        built_at = self._built_at
+        if built_at is None:
+            self.rebuild()
+        elif time.monotonic() - built_at > self.refresh_seconds:
+            self._refresh_in_background()
+
+    @staticmethod
+    def _normalized(keys):
+        return tuple(sorted({normalize(key) for key in keys if normalize(key)}))
+
+    def _remove_locked(self, entry_id):
+        old = self._entries.pop(entry_id, None)
+        if old is None:
+            return
+        for key in old[0]:
+            index = bisect.bisect_left(self._keys, (key, entry_id))
+            if index < len(self._keys) and self._keys[index] == (key, entry_id):
+                del self._keys[index]
+
+    def put(self, entry_id, keys, payload):
+        """Add or replace one entry (no-op until the index has been loaded)."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(lambda: self._put_locked(entry_id, keys, payload))
+            if self._built_at is not None:
+                self._put_locked(entry_id, keys, payload)
+
+    def _put_locked(self, entry_id, keys, payload):
+        self._remove_locked(entry_id)
+        keys = self._normalized(keys)
+        self._entries[entry_id] = (keys, payload)
+        for key in keys:
+            bisect.insort(self._keys, (key, entry_id))
+
+    def discard(self, entry_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(lambda: self._remove_locked(entry_id))
+            self._remove_locked(entry_id)
+
+    def search(self, prefix, limit=DEFAULT_LIMIT):
+        """Payloads of up to limit entries having a key that starts with prefix."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self._ensure_built()
+
+        results = []
+        seen = set()
+        with self._lock:
+            index = bisect.bisect_left(self._keys, (prefix,))
+            while index < len(self._keys) and len(results) < limit:
+                key, entry_id = self._keys[index]
+                if not key.startswith(prefix):
+                    break
+                if entry_id not in seen:
+                    seen.add(entry_id)
+                    results.append(self._entries[entry_id][1])
+                index += 1
+        return results
+
+    def exact(self, text):
+        """Ids of the entries having a key equal to text."""
+        text = normalize(text)
+        if not text:
+            return []
+        self._ensure_built()
+        with self._lock:
+            index = bisect.bisect_left(self._keys, (text,))
+            ids = []
+            while index < len(self._keys) and self._keys[index][0] == text:
+                ids.append(self._keys[index][1])
+                index += 1
+        return ids
@@ -0,0 +1,46 @@
+"""
+Run independent blocking remote calls (Supabase, PayMaya) concurrently.
+
+    patients, queue = gather(
+        lambda: supabase.table("patient_patient").select("*").execute(),
+        lambda: supabase.table("queueing_temporarystoragequeue").select("*").execute(),
+    )
+
+Each callable runs in a worker thread and the calls are awaited together with
+asyncio.gather, so a view waits for the slowest call instead of the sum of all
+of them. Under Daphne the gather runs on the server's event loop; elsewhere
+(tests, management commands) on a temporary one. Only pass remote I/O here:
+ORM queries belong in the request thread, which owns the DB connection.
+
+iterate_async() turns a blocking generator (an export reading the ORM in
+batches) into the async iterator a StreamingHttpResponse needs under Daphne:
+Django's ASGI handler reads a sync iterator to the end before sending a byte,
+while an async one is sent chunk by chunk. Each step runs in the thread that
+holds the request's DB connection.
+"""
+import asyncio
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+
+def gather(*calls):
+    """Results of the zero-argument callables, in order; the first exception is raised."""
+    if len(calls) < 2:
+        return [call() for call in calls]
+
+    async def run():
+        return await asyncio.gather(*(sync_to_async(call, thread_sensitive=False)() for call in calls))
+
+    return list(async_to_sync(run)())
+
+
+async def iterate_async(iterable):
+    """Async iterator over a blocking iterable, advancing it one item at a time off the event loop."""
+    iterator = iter(iterable)
+    done = object()
+    advance = sync_to_async(next, thread_sensitive=True)
+    while True:
+        item = await advance(iterator, done)
+        if item is done:
+            break
+        yield item
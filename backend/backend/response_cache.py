@@ -0,0 +1,170 @@
+"""
+Response cache for read-heavy DRF endpoints (dashboards, lookup lists).
+
+    class TotalPatientsAPIView(APIView):
+        @cached_response(scope="role", depends_on=["patient.Patient"])
+        def get(self, request): ...
+
+A successful GET response's data is cached per view, scope and URL (path and
+query string) for `timeout` seconds. The scope says who may share an entry:
+
+    "role"    users with the same role (the response does not depend on who asks)
+    "user"    only the same user
+    "public"  everyone
+
+Each model in depends_on has a version key in the cache, bumped after commit
+by post_save / post_delete receivers in the models' apps (see
+models_changed), and the versions are part of the cache key, so a write to
+any of them retires every entry built from it. Endpoints reading data with
+no Django model (Supabase-only tables) rely on the timeout alone.
+
+Responses carry an ETag of their data; a request whose If-None-Match matches
+gets an empty 304. Hits, misses and 304s are counted per view in this
+process (response_cache_metrics()).
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+# bump when the cached entry format changes so old entries are ignored
+RESPONSE_SCHEMA = 1
+VERSION_TIMEOUT = 60 * 60 * 24
+SCOPES = ("role", "user", "public")
+
+
+class CacheCounters:
+    """Per-view hit / miss / not-modified counters for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {"hits": 0, "misses": 0, "not_modified": 0})
+
+    def record(self, name, outcome):
+        with self._lock:
+            self._stats[name][outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+counters = CacheCounters()
+
+
+def response_cache_metrics():
+    """{"<view>.<method>": {hits, misses, not_modified}, ...}"""
+    return counters.snapshot()
+
+
+def _version_key(label):
+    return f"response:version:{label}"
+
+
+def _versions(labels):
+    keys = [_version_key(label) for label in labels]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # seeded from the clock so an evicted version never comes back
+            # with a value an old entry was stored under
+            cache.add(key, int(time.time() * 1000), VERSION_TIMEOUT)
+            versions[key] = cache.get(key) or 0
+    return [versions[key] for key in keys]
+
+
+def bump_version(label):
+    key = _version_key(label)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), VERSION_TIMEOUT)
+
+
+def models_changed(*models):
+    """Retire cached responses depending on these models once the current transaction commits."""
+    labels = [model if isinstance(model, str) else model._meta.label for model in models]
+    transaction.on_commit(lambda: [bump_version(label) for label in labels])
+
+
+def _scope_value(request, scope):
+    user = request.user
+    if scope == "public" or not user.is_authenticated:
+        return "anon"
+    if scope == "user":
+        return f"user:{user.pk}"
+    return f"role:{getattr(user, 'role', '') or ''}"
+
+
+def _etag(data):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return '"%s"' % hashlib.md5(body.encode()).hexdigest()
+
+
+def _matches(request, etag):
+    header = request.headers.get("If-None-Match", "")
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+
+def _finish(request, name, etag, data, status_code, outcome):
+    if _matches(request, etag):
+        counters.record(name, "not_modified")
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        counters.record(name, outcome)
+        response = Response(data, status=status_code)
+    response["ETag"] = etag
+    # browsers must revalidate, which costs a cache read and an empty 304
+    response["Cache-Control"] = "private, no-cache"
+    response["X-Cache"] = "HIT" if outcome == "hits" else "MISS"
+    return response
+
+
+def cached_response(scope="role", timeout=None, depends_on=()):
+    """Decorator for a DRF view handler (get, list or a GET @action)."""
+    if scope not in SCOPES:
+        raise ValueError(f"scope must be one of {SCOPES}")
+    labels = tuple(depends_on)
+
+    def decorator(handler):
+        name = f"{handler.__module__}.{handler.__qualname__}"
+
+        @functools.wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return handler(self, request, *args, **kwargs)
+
+            versions = ".".join(str(version) for version in _versions(labels))
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = f"response:{name}:{RESPONSE_SCHEMA}:{_scope_value(request, scope)}:{versions}:{path}"
+
+            entry = cache.get(key)
+            if entry is not None:
+                return _finish(request, name, entry["etag"], entry["data"], entry["status"], "hits")
+
+            response = handler(self, request, *args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != status.HTTP_200_OK:
+                counters.record(name, "misses")
+                return response
+
+            entry = {"data": response.data, "status": response.status_code, "etag": _etag(response.data)}
+            ttl = timeout if timeout is not None else settings.RESPONSE_CACHE_TIMEOUT
+            cache.set(key, entry, ttl)
+            return _finish(request, name, entry["etag"], entry["data"], entry["status"], "misses")
+
+        return wrapper
+
+    return decorator
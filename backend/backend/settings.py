@@ -170,6 +170,36 @@ else:
         },
     }
 
+# seconds to coalesce queue changes before one websocket broadcast (0 = send immediately)
+QUEUE_BROADCAST_WINDOW = float(os.environ.get("QUEUE_BROADCAST_WINDOW", 0.15))
+
+# seconds between full reloads of the in-process autocomplete indexes (patients, medicines);
+# saves in this process update them immediately
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.environ.get("AUTOCOMPLETE_REFRESH_SECONDS", 300))
+
+# default lifetime of cached dashboard responses (backend.response_cache); writes
+# to the models a response depends on retire it sooner
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", 300))
+
+# seconds between expired reservation sweeps inside each web process
+# (appointment.sweeper); 0 disables it, e.g. when `manage.py sweep_reservations` runs from cron
+RESERVATION_SWEEP_INTERVAL = float(os.environ.get("RESERVATION_SWEEP_INTERVAL", 0))
+
+# cache (queue snapshots etc.) - shared through Redis when available
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
 
 
 # Database
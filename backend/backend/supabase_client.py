@@ -1,7 +1,18 @@
 # supabase_client.py
 import os
 import logging
-from supabase import create_client
+import random
+import threading
+import time
+from collections import defaultdict
+
+import httpx
+from supabase import Client as SupabaseClient, ClientOptions
+from postgrest import SyncPostgrestClient
+from postgrest.utils import SyncClient as PostgrestSession
+from storage3 import SyncStorageClient
+from storage3.utils import SyncClient as StorageSession
+from django.utils.functional import SimpleLazyObject
 import boto3
 from botocore.client import Config
 
@@ -17,13 +28,167 @@ S3_BUCKET = os.getenv("SUPABASE_STORAGE_BUCKET")
 S3_ENDPOINT = os.getenv("SUPABASE_S3_ENDPOINT_URL")
 S3_REGION = os.getenv("SUPABASE_S3_REGION_NAME")
 
+# HTTP behaviour of every Supabase call (PostgREST and storage)
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", 10))
+SUPABASE_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", 3))
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", 20))
+SUPABASE_MAX_KEEPALIVE = int(os.getenv("SUPABASE_MAX_KEEPALIVE", 10))
+SUPABASE_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", 30))
+SUPABASE_RETRIES = int(os.getenv("SUPABASE_RETRIES", 2))
+SUPABASE_RETRY_BACKOFF = float(os.getenv("SUPABASE_RETRY_BACKOFF", 0.2))
+SUPABASE_SLOW_CALL_MS = float(os.getenv("SUPABASE_SLOW_CALL_MS", 1000))
+
+# safe to resend after any failure; anything else is only resent when the
+# connection was never made
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUSES = {502, 503, 504}
+
+
+class CallMetrics:
+    """Per-resource latency counters for Supabase calls in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+    def record(self, name, elapsed_ms, error=False, retries=0):
+        with self._lock:
+            stats = self._stats[name]
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["retries"] += retries
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        if elapsed_ms >= SUPABASE_SLOW_CALL_MS:
+            logger.warning("Slow Supabase call %s: %.0f ms (%d retries)", name, elapsed_ms, retries)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {**stats, "avg_ms": stats["total_ms"] / stats["calls"] if stats["calls"] else 0.0}
+                for name, stats in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+metrics = CallMetrics()
+
+
+def supabase_metrics():
+    """{"GET /rest/v1/<table>": {calls, errors, retries, total_ms, max_ms, avg_ms}, ...}"""
+    return metrics.snapshot()
+
+
+class RetryingTransport(httpx.BaseTransport):
+    """
+    Pooled keep-alive transport that retries transient failures with
+    exponential backoff and full jitter, and records the latency of each call.
+    """
+
+    def __init__(self, retries=SUPABASE_RETRIES, backoff=SUPABASE_RETRY_BACKOFF, verify=True):
+        self.retries = retries
+        self.backoff = backoff
+        self._transport = httpx.HTTPTransport(
+            verify=verify,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=SUPABASE_MAX_CONNECTIONS,
+                max_keepalive_connections=SUPABASE_MAX_KEEPALIVE,
+                keepalive_expiry=SUPABASE_KEEPALIVE_EXPIRY,
+            ),
+        )
+
+    def _sleep(self, attempt):
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def handle_request(self, request):
+        name = f"{request.method} {request.url.path}"
+        idempotent = request.method in IDEMPOTENT_METHODS
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                response = self._transport.handle_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                # the request never left this process
+                if attempt >= self.retries:
+                    metrics.record(name, (time.monotonic() - started) * 1000, error=True, retries=attempt)
+                    raise
+            except httpx.TransportError:
+                if not idempotent or attempt >= self.retries:
+                    metrics.record(name, (time.monotonic() - started) * 1000, error=True, retries=attempt)
+                    raise
+            else:
+                if not (idempotent and response.status_code in RETRY_STATUSES and attempt < self.retries):
+                    metrics.record(
+                        name, (time.monotonic() - started) * 1000,
+                        error=response.status_code >= 500, retries=attempt,
+                    )
+                    return response
+                response.close()
+            self._sleep(attempt)
+            attempt += 1
+
+    def close(self):
+        self._transport.close()
+
+
+def _timeout():
+    return httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT)
+
+
+class PooledPostgrestClient(SyncPostgrestClient):
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return PostgrestSession(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=RetryingTransport(verify=verify),
+        )
+
+
+class PooledStorageClient(SyncStorageClient):
+    def _create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return StorageSession(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=RetryingTransport(verify=verify),
+        )
+
+
+class PooledSupabaseClient(SupabaseClient):
+    """Supabase client whose PostgREST and storage calls share a pooled, retrying transport."""
+
+    @staticmethod
+    def _init_postgrest_client(rest_url, headers, schema, timeout=None, verify=True, proxy=None):
+        return PooledPostgrestClient(
+            rest_url, headers=headers, schema=schema, timeout=timeout or _timeout(), verify=verify,
+        )
+
+    @staticmethod
+    def _init_storage_client(storage_url, headers, storage_client_timeout=None, verify=True, proxy=None):
+        return PooledStorageClient(storage_url, headers, storage_client_timeout or _timeout(), verify)
+
+
+def create_supabase_client(url, key):
+    """A pooled client with the SUPABASE_* timeouts; raises like supabase.create_client."""
+    options = ClientOptions(postgrest_client_timeout=_timeout(), storage_client_timeout=_timeout())
+    return PooledSupabaseClient.create(url, key, options)
+
+
 def get_supabase_service_client():
     """Return supabase client created with SERVICE ROLE key (server side only)."""
     if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
         logger.warning("Supabase service role key missing.")
         return None
     try:
-        return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+        return create_supabase_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
     except Exception as e:
         logger.exception("Failed to create supabase service client: %s", e)
         return None
@@ -33,7 +198,7 @@ def get_supabase_public_client():
     if not SUPABASE_URL or not SUPABASE_KEY:
         return None
     try:
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
+        return create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
     except Exception as e:
         logger.exception("Failed to create supabase public client: %s", e)
         return None
@@ -54,7 +219,7 @@ def get_boto3_s3_client():
         config=config
     )
 
-# singletons for convenience
-supabase = get_supabase_service_client()
-supabase_public = get_supabase_public_client()
-s3_client = get_boto3_s3_client()
+# shared per process, created on first use; falsy when not configured
+supabase = SimpleLazyObject(get_supabase_service_client)
+supabase_public = SimpleLazyObject(get_supabase_public_client)
+s3_client = SimpleLazyObject(get_boto3_s3_client)
@@ -0,0 +1,22 @@
+"""Type-ahead index of medicines for prescribing (see backend.autocomplete)."""
+from backend.autocomplete import PrefixIndex
+
+PAYLOAD_FIELDS = ("id", "name", "strength", "dosage_form", "stocks")
+
+
+def medicine_entry(medicine):
+    """(id, keys, payload) for a medicine given as a dict of field values."""
+    payload = {field: medicine.get(field) for field in PAYLOAD_FIELDS}
+    return medicine["id"], (medicine.get("name"),), payload
+
+
+def load_medicines():
+    from .models import Medicine
+    return (medicine_entry(row) for row in Medicine.objects.values(*PAYLOAD_FIELDS))
+
+
+medicine_index = PrefixIndex(load_medicines)
+
+
+def index_medicine(medicine):
+    medicine_index.put(*medicine_entry({field: getattr(medicine, field) for field in PAYLOAD_FIELDS}))
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
 # Create your models here.
 class Medicine(models.Model):
@@ -14,4 +16,16 @@ class Medicine(models.Model):
     is_active = models.BooleanField(default=True)
     
     def __str__(self):
-        return f"{self.name} ({self.strength}) - {self.stocks} left"
\ No newline at end of file
+        return f"{self.name} ({self.strength}) - {self.stocks} left"
+
+
+# keep the prescribing type-ahead index current (medicine.autocomplete)
+@receiver(post_save, sender=Medicine)
+def index_medicine_for_autocomplete(sender, instance, **kwargs):
+    from .autocomplete import index_medicine
+    index_medicine(instance)
+
+@receiver(post_delete, sender=Medicine)
+def unindex_medicine_for_autocomplete(sender, instance, **kwargs):
+    from .autocomplete import medicine_index
+    medicine_index.discard(instance.id)
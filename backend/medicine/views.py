@@ -6,6 +6,8 @@ from rest_framework import status
 
 from .models import Medicine
 from .serializers import MedicineSerializer
+from .autocomplete import medicine_index
+from backend.autocomplete import parse_limit
 from user.permissions import IsMedicalStaff, isSecretary, isDoctor
 from rest_framework.views import APIView
 
@@ -15,6 +17,7 @@ from patient.models import Prescription, Diagnosis
 from queueing.models import Treatment
 
 from backend.supabase_client import supabase
+from backend.concurrency import gather
 import pandas as pd
 from sklearn.model_selection import train_test_split
 import lightgbm as lgb
@@ -55,6 +58,22 @@ class SearchMedicine(APIView):
     
         return Response({'medicine': data}, status=status.HTTP_200_OK)
     
+class MedicineAutocomplete(APIView):
+    """Type-ahead for prescribing, served from the in-process index (medicine.autocomplete)."""
+    permission_classes = [IsMedicalStaff]
+
+    def get(self, request, format=None):
+        try:
+            limit = parse_limit(request.GET.get('limit'))
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            medicines = medicine_index.search(request.GET.get('q', ''), limit=limit)
+            return Response({'medicine': medicines}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=500)
+
 class PrescriptionViews(generics.ListAPIView):
     queryset = Prescription.objects.all()
     serializer_class = PrescriptionSerializer
@@ -114,8 +133,10 @@ class Predict(APIView):
     
     def get(self, request):
         try:
-            medicines = supabase.table('medicine_medicine').select().execute()
-            prescriptions = supabase.table('patient_prescription').select().execute()
+            medicines, prescriptions = gather(
+                lambda: supabase.table('medicine_medicine').select().execute(),
+                lambda: supabase.table('patient_prescription').select().execute(),
+            )
         
             med_df = pd.DataFrame(medicines.data)
             pres_df = pd.DataFrame(prescriptions.data)
@@ -0,0 +1,37 @@
+"""Type-ahead index of patients for the registration desk (see backend.autocomplete)."""
+from backend.autocomplete import PrefixIndex
+
+PAYLOAD_FIELDS = (
+    "patient_id", "first_name", "middle_name", "last_name", "phone_number", "date_of_birth",
+)
+
+
+def patient_keys(patient):
+    first = patient.get("first_name") or ""
+    last = patient.get("last_name") or ""
+    return (
+        f"{first} {last}",
+        f"{last} {first}",
+        patient.get("phone_number"),
+        patient.get("email"),
+    )
+
+
+def patient_entry(patient):
+    """(id, keys, payload) for a patient given as a dict of field values."""
+    payload = {field: patient.get(field) for field in PAYLOAD_FIELDS}
+    return patient["patient_id"], patient_keys(patient), payload
+
+
+def load_patients():
+    from .models import Patient
+    rows = Patient.objects.values(*PAYLOAD_FIELDS, "email").iterator(chunk_size=2000)
+    return (patient_entry(row) for row in rows)
+
+
+patient_index = PrefixIndex(load_patients)
+
+
+def index_patient(patient):
+    values = {field: getattr(patient, field) for field in (*PAYLOAD_FIELDS, "email")}
+    patient_index.put(*patient_entry(values))
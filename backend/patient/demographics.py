@@ -0,0 +1,61 @@
+"""
+Shared age / display helpers for patient and queue payloads.
+
+Use annotate_age() on querysets so list endpoints get the age from the
+database, add_ages() for rows that arrive as dicts (Supabase responses),
+and age_on() for a single value.
+"""
+from datetime import date, datetime
+
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import ExtractYear
+from django.utils import timezone
+
+
+def _as_date(dob):
+    if isinstance(dob, datetime):
+        return dob.date()
+    if isinstance(dob, date):
+        return dob
+    if isinstance(dob, str) and dob:
+        try:
+            return date.fromisoformat(dob[:10])
+        except ValueError:
+            return None
+    return None
+
+
+def age_on(dob, today=None):
+    """Whole years since dob (a date, datetime or ISO string), or None."""
+    dob = _as_date(dob)
+    if dob is None:
+        return None
+    today = today or timezone.localdate()
+    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+
+
+def add_ages(rows, dob_key="date_of_birth", age_key="age"):
+    """Set rows[i][age_key] for a list of dicts, computing today only once."""
+    today = timezone.localdate()
+    for row in rows:
+        row[age_key] = age_on(row.get(dob_key), today)
+    return rows
+
+
+def age_expression(dob_field="date_of_birth", today=None):
+    """Whole years between dob_field and today, computed by the database."""
+    today = today or timezone.localdate()
+    birthday_not_reached = Case(
+        When(
+            Q(**{f"{dob_field}__month__gt": today.month})
+            | Q(**{f"{dob_field}__month": today.month, f"{dob_field}__day__gt": today.day}),
+            then=Value(1),
+        ),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return Value(today.year) - ExtractYear(dob_field) - birthday_not_reached
+
+
+def annotate_age(queryset, dob_field="date_of_birth", name="age"):
+    return queryset.annotate(**{name: age_expression(dob_field)})
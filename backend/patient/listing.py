@@ -0,0 +1,148 @@
+"""
+Patient list / patient flow payloads built on the ORM.
+
+Patients are read in primary-key order with their latest queue status
+annotated by a correlated subquery (served by the (patient, -created_at)
+index), so Waiting patients are filtered in SQL. Queue history for a batch of
+patients is fetched with one query and joined by patient_id.
+
+  GET ...                      -> full list (legacy shape, a JSON array)
+  GET ...?limit=N[&cursor=c]   -> {"results": [...], "next_cursor": c | null}
+  GET ...?export=json          -> streamed JSON array, read in batches off the
+                                  event loop (backend.concurrency.iterate_async)
+"""
+import base64
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Q, Subquery
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+from backend.concurrency import iterate_async
+from queueing.models import TemporaryStorageQueue, Treatment
+
+from .demographics import annotate_age
+from .models import Patient
+from .serializers import PatientSerializer
+
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 500
+
+PATIENT_FIELDS = (
+    "patient_id", "first_name", "middle_name", "last_name", "email", "phone_number",
+    "date_of_birth", "street_address", "barangay", "municipal_city",
+)
+QUEUE_FIELDS = ("id", "status", "created_at", "priority_level", "queue_number", "complaint")
+
+# on-call account that sees every patient
+ALL_PATIENTS_USER_ID = "cooper-020006"
+
+
+def visible_patients(user):
+    """Patients the user may list, or None when the role may not list patients."""
+    role = getattr(user, "role", None)
+    if role == "on-call-doctor" and user.id != ALL_PATIENTS_USER_ID:
+        treated = Treatment.objects.filter(doctor_id=user.id).values("patient_id")
+        return Patient.objects.filter(patient_id__in=treated)
+    if role in ["secretary", "admin"] or user.id == ALL_PATIENTS_USER_ID:
+        return Patient.objects.all()
+    return None
+
+
+def listing_queryset(user, exclude_waiting=False):
+    queryset = visible_patients(user)
+    if queryset is None:
+        return None
+
+    if exclude_waiting:
+        latest_status = (
+            TemporaryStorageQueue.objects
+            .filter(patient=OuterRef("pk"))
+            .order_by("-created_at")
+            .values("status")[:1]
+        )
+        # patients without any queue entry (NULL status) are kept
+        queryset = (
+            queryset
+            .annotate(latest_queue_status=Subquery(latest_status))
+            .filter(Q(latest_queue_status__isnull=True) | ~Q(latest_queue_status="Waiting"))
+        )
+    return annotate_age(queryset).order_by("patient_id")
+
+
+def patient_rows(queryset):
+    """Serialize a batch of patients with their queue history (two queries)."""
+    patients = list(queryset.values(*PATIENT_FIELDS, "age"))
+
+    queue_by_patient = {patient["patient_id"]: [] for patient in patients}
+    entries = (
+        TemporaryStorageQueue.objects
+        .filter(patient_id__in=queue_by_patient.keys())
+        .order_by("created_at")
+        .values("patient_id", *QUEUE_FIELDS)
+    )
+    for entry in entries:
+        queue_by_patient[entry.pop("patient_id")].append(entry)
+
+    for patient in patients:
+        patient["queueing_temporarystoragequeue"] = queue_by_patient[patient["patient_id"]]
+    return PatientSerializer(patients, many=True).data
+
+
+def encode_cursor(patient_id):
+    return base64.urlsafe_b64encode(patient_id.encode()).decode()
+
+
+def decode_cursor(cursor):
+    return base64.urlsafe_b64decode(cursor.encode()).decode()
+
+
+def export_stream(queryset):
+    """
+    Yield the whole listing as one JSON array, one chunk per EXPORT_BATCH_SIZE
+    patients (wrap in iterate_async to serve it).
+    """
+    yield "["
+    last_id = None
+    first = True
+    while True:
+        batch = queryset if last_id is None else queryset.filter(patient_id__gt=last_id)
+        rows = patient_rows(batch[:EXPORT_BATCH_SIZE])
+        if rows:
+            yield ("" if first else ",") + ",".join(json.dumps(row, cls=DjangoJSONEncoder) for row in rows)
+            first = False
+        if len(rows) < EXPORT_BATCH_SIZE:
+            break
+        last_id = rows[-1]["patient_id"]
+    yield "]"
+
+
+def patient_listing_response(request, exclude_waiting=False):
+    queryset = listing_queryset(request.user, exclude_waiting=exclude_waiting)
+    if queryset is None:
+        return Response({"error": "Unauthorized role"}, status=status.HTTP_403_FORBIDDEN)
+
+    if request.query_params.get("export") == "json":
+        # async, or Daphne would buffer the whole export before sending it
+        response = StreamingHttpResponse(iterate_async(export_stream(queryset)), content_type="application/json")
+        response["Content-Disposition"] = 'attachment; filename="patients.json"'
+        return response
+
+    limit = request.query_params.get("limit")
+    if limit is None:
+        return Response(patient_rows(queryset), status=status.HTTP_200_OK)
+
+    try:
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            queryset = queryset.filter(patient_id__gt=decode_cursor(cursor))
+    except (ValueError, UnicodeDecodeError):
+        return Response({"error": "Invalid limit or cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+    # one extra row tells whether another page follows
+    rows = patient_rows(queryset[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]["patient_id"]) if len(rows) > limit else None
+    return Response({"results": rows[:limit], "next_cursor": next_cursor}, status=status.HTTP_200_OK)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from patient.rollups import rebuild_rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily reporting rollups (visits, lab results, diagnoses, medications) from the source tables'
+
+    def handle(self, *args, **kwargs):
+        written = rebuild_rollups()
+        for name, rows in written.items():
+            self.stdout.write(f'{name}: {rows} rows')
+        self.stdout.write(self.style.SUCCESS('Rollups rebuilt successfully'))
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+# Trigram indexes for patient search (patient.search). Django's icontains on
+# PostgreSQL compiles to UPPER("col"::text) LIKE UPPER('%q%'), so the indexes
+# are built on that expression.
+SEARCH_COLUMNS = ("first_name", "last_name", "email", "phone_number")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('patient', '0022_remove_healthtips_patient_hea_status_ab7ca1_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm;',
+            reverse_sql=migrations.RunSQL.noop
+        ),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE INDEX IF NOT EXISTS patient_patient_{column}_trgm '
+            f'ON patient_patient USING gin (UPPER("{column}"::text) gin_trgm_ops);',
+            reverse_sql=f'DROP INDEX IF EXISTS patient_patient_{column}_trgm;'
+        )
+        for column in SEARCH_COLUMNS
+    ]
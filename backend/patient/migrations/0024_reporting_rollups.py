@@ -0,0 +1,61 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicine', '0006_medicine_is_active'),
+        ('patient', '0023_patient_search_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabResultRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('results', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DiagnosisRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('description', models.CharField(max_length=255)),
+                ('diagnoses', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'description'), name='diagnosis_rollup_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('priority_level', models.CharField(max_length=10)),
+                ('complaint', models.CharField(blank=True, default='', max_length=100)),
+                ('visits', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'priority_level', 'complaint'), name='visit_rollup_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MedicationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('prescriptions', models.IntegerField(default=0)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='medicine.medicine')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'medication'), name='medication_rollup_key')],
+            },
+        ),
+    ]
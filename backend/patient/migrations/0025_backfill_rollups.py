@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def backfill_rollups(apps, schema_editor):
+    from patient.rollups import rebuild_rollups
+
+    rebuild_rollups(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient', '0024_reporting_rollups'),
+        ('queueing', '0022_queuecounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -2,13 +2,14 @@ import random
 import string
 from django.db import models
 from datetime import date
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
 
 
 
 from user.models import BaseProfile, Doctor
+from .demographics import age_on
 from medicine.models import Medicine
 
 
@@ -43,12 +44,10 @@ class Patient(BaseProfile):
         return dict(self.COMPLAINT_CHOICES).get(self.complaint, ' ')
 
     def get_age(self):
-        if not self.date_of_birth:
-            return None
-        today = date.today()
-        return today.year - self.date_of_birth.year - (
-            (today.month, today.day) < (self.date_of_birth.month, self.date_of_birth.day)
-        )
+        # list querysets annotate the age in SQL (demographics.annotate_age)
+        if "age" in self.__dict__:
+            return self.__dict__["age"]
+        return age_on(self.date_of_birth)
 
     def save(self, *args, **kwargs):
         # Assign patient_id once from user.id if it’s not set
@@ -134,6 +133,45 @@ class LabResult(models.Model):
     def __str__(self):
         return f"LabResult for {self.lab_request}"
 
+
+# Reporting rollups (see patient.rollups): one row per day and grouping key,
+# kept current by signals and rebuilt by `manage.py rebuild_rollups`.
+class VisitRollup(models.Model):
+    day = models.DateField()
+    priority_level = models.CharField(max_length=10)
+    complaint = models.CharField(max_length=100, blank=True, default="")
+    visits = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "priority_level", "complaint"], name="visit_rollup_key"),
+        ]
+
+class LabResultRollup(models.Model):
+    day = models.DateField(unique=True)
+    results = models.IntegerField(default=0)
+
+class DiagnosisRollup(models.Model):
+    day = models.DateField()
+    description = models.CharField(max_length=255)
+    diagnoses = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "description"], name="diagnosis_rollup_key"),
+        ]
+
+class MedicationRollup(models.Model):
+    day = models.DateField()
+    medication = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name="rollups")
+    quantity = models.IntegerField(default=0)
+    prescriptions = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "medication"], name="medication_rollup_key"),
+        ]
+
     
 
 @receiver(pre_save, sender=LabRequest)
@@ -144,4 +182,76 @@ def set_lab_request_id(sender, instance, **kwargs):
 @receiver(pre_save, sender=LabResult)
 def set_lab_result_id(sender, instance, **kwargs):
     if not instance.id:
-        instance.id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
\ No newline at end of file
+        instance.id = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+
+
+# keep the registration type-ahead index current (patient.autocomplete)
+@receiver(post_save, sender=Patient)
+def index_patient_for_autocomplete(sender, instance, **kwargs):
+    from .autocomplete import index_patient
+    index_patient(instance)
+
+@receiver(post_delete, sender=Patient)
+def unindex_patient_for_autocomplete(sender, instance, **kwargs):
+    from .autocomplete import patient_index
+    patient_index.discard(instance.patient_id)
+
+
+# drop the patient's cached portal payloads (patient.records) after commit
+@receiver(post_save, sender=Diagnosis)
+@receiver(post_delete, sender=Diagnosis)
+@receiver(post_save, sender=Prescription)
+@receiver(post_delete, sender=Prescription)
+@receiver(post_save, sender=LabRequest)
+@receiver(post_delete, sender=LabRequest)
+def patient_record_changed(sender, instance, **kwargs):
+    from .records import records_changed
+    records_changed(instance.patient_id)
+
+@receiver(post_save, sender=LabResult)
+@receiver(post_delete, sender=LabResult)
+def lab_result_changed(sender, instance, **kwargs):
+    from .records import records_changed
+    try:
+        patient_id = instance.lab_request.patient_id if instance.lab_request_id else None
+    except LabRequest.DoesNotExist:
+        # deleted along with its request, which invalidates on its own
+        patient_id = None
+    records_changed(patient_id)
+
+
+# keep the reporting rollups current (patient.rollups)
+@receiver(pre_save, sender=Diagnosis)
+@receiver(pre_save, sender=Prescription)
+@receiver(pre_save, sender=LabResult)
+def remember_rollup_row(sender, instance, update_fields=None, **kwargs):
+    from .rollups import remember_previous
+    remember_previous(sender, instance, update_fields)
+
+@receiver(post_save, sender=Diagnosis)
+@receiver(post_save, sender=Prescription)
+@receiver(post_save, sender=LabResult)
+def update_rollups_on_save(sender, instance, created, update_fields=None, **kwargs):
+    from .rollups import record_saved
+    record_saved(sender, instance, created, update_fields)
+
+@receiver(post_delete, sender=Diagnosis)
+@receiver(post_delete, sender=Prescription)
+@receiver(post_delete, sender=LabResult)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    from .rollups import record_deleted
+    record_deleted(sender, instance)
+
+
+# cached dashboard responses (backend.response_cache)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+@receiver(post_save, sender=Diagnosis)
+@receiver(post_delete, sender=Diagnosis)
+@receiver(post_save, sender=LabRequest)
+@receiver(post_delete, sender=LabRequest)
+@receiver(post_save, sender=LabResult)
+@receiver(post_delete, sender=LabResult)
+def patient_responses_changed(sender, **kwargs):
+    from backend.response_cache import models_changed
+    models_changed(sender)
@@ -0,0 +1,221 @@
+"""
+Per-patient record cache for the patient portal.
+
+Portal payloads (prescriptions, records, lab results) are cached under
+patient:records:<patient_id>:<name>:<version>. The version lives in its own
+key and is bumped after commit by post_save / post_delete receivers on
+Treatment, Diagnosis, Prescription, LabRequest and LabResult (and when a
+treatment's diagnoses or prescriptions change), PreliminaryAssessment and
+TemporaryStorageQueue (for the patient report), and on staff name or
+specialization changes for every patient whose record shows that staff member
+(staff_records_changed), so a portal visit is one cache read until something
+in that patient's record actually changes.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+RECORD_CACHE_TIMEOUT = 60 * 60 * 24
+# bump when the shape of a cached payload changes so old entries are ignored
+RECORD_SCHEMA = 1
+
+DIAGNOSIS_FIELDS = ("id", "patient_id", "diagnosis_code", "diagnosis_description", "diagnosis_date")
+PRESCRIPTION_FIELDS = (
+    "id", "patient_id", "medication_id", "dosage", "frequency", "quantity", "start_date", "end_date",
+)
+
+
+def _version_key(patient_id):
+    return f"patient:records-version:{patient_id}"
+
+
+def record_version(patient_id):
+    key = _version_key(patient_id)
+    # seeded from the clock so a version evicted from the cache never comes
+    # back with a value an old payload was stored under
+    cache.add(key, int(time.time() * 1000), RECORD_CACHE_TIMEOUT)
+    return cache.get(key) or 0
+
+
+def bump_record_version(patient_id):
+    key = _version_key(patient_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), RECORD_CACHE_TIMEOUT)
+
+
+def records_changed(patient_id):
+    """Invalidate the patient's cached portal payloads once the current transaction commits."""
+    if patient_id:
+        transaction.on_commit(lambda: bump_record_version(patient_id))
+
+
+def staff_records_changed(user_id):
+    """records_changed for every patient treated by, or with lab results submitted by, this user."""
+    from queueing.models import Treatment
+    from .models import LabResult
+
+    if not user_id:
+        return
+    treated = Treatment.objects.filter(doctor_id=user_id).values_list("patient_id", flat=True)
+    submitted = LabResult.objects.filter(submitted_by_id=user_id).values_list("lab_request__patient_id", flat=True)
+    for patient_id in set(treated.distinct()) | set(submitted.distinct()):
+        records_changed(patient_id)
+
+
+def cached_record(patient_id, name, build):
+    """build() for this patient, or its cached result while the record version is unchanged."""
+    key = f"patient:records:{patient_id}:{name}:{RECORD_SCHEMA}:{record_version(patient_id)}"
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, RECORD_CACHE_TIMEOUT)
+    return payload
+
+
+def treatment_graph(patient_id):
+    """
+    The patient's treatments newest first, each with doctor_info and its
+    diagnosis / prescription links as (link id, row) pairs, in three queries.
+    """
+    from queueing.models import Treatment
+
+    rows = list(
+        Treatment.objects
+        .filter(patient_id=patient_id)
+        .order_by("-created_at")
+        .values(
+            "id", "treatment_notes", "created_at", "updated_at",
+            "doctor__id", "doctor__first_name", "doctor__last_name",
+            "doctor__doctor_profile__specialization",
+        )
+    )
+    diagnoses = {row["id"]: [] for row in rows}
+    prescriptions = {row["id"]: [] for row in rows}
+
+    diagnosis_links = (
+        Treatment.diagnoses.through.objects
+        .filter(treatment__patient_id=patient_id)
+        .order_by("id")
+        .values("id", "treatment_id", *[f"diagnosis__{field}" for field in DIAGNOSIS_FIELDS])
+    )
+    for link in diagnosis_links:
+        diagnosis = {field: link[f"diagnosis__{field}"] for field in DIAGNOSIS_FIELDS}
+        diagnoses[link["treatment_id"]].append((link["id"], diagnosis))
+
+    prescription_links = (
+        Treatment.prescriptions.through.objects
+        .filter(treatment__patient_id=patient_id)
+        .order_by("id")
+        .values(
+            "id", "treatment_id", *[f"prescription__{field}" for field in PRESCRIPTION_FIELDS],
+            "prescription__medication__name",
+        )
+    )
+    for link in prescription_links:
+        prescription = {field: link[f"prescription__{field}"] for field in PRESCRIPTION_FIELDS}
+        prescription["medication"] = {
+            "id": prescription["medication_id"],
+            "name": link["prescription__medication__name"],
+        }
+        prescriptions[link["treatment_id"]].append((link["id"], prescription))
+
+    return [
+        {
+            "id": row["id"],
+            "treatment_notes": row["treatment_notes"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "doctor_info": {
+                "id": row["doctor__id"],
+                "name": " ".join(filter(None, [row["doctor__first_name"], row["doctor__last_name"]])),
+                "specialization": row["doctor__doctor_profile__specialization"],
+            },
+            "diagnosis_links": diagnoses[row["id"]],
+            "prescription_links": prescriptions[row["id"]],
+        }
+        for row in rows
+    ]
+
+
+def prescriptions_payload(patient_id):
+    prescriptions = []
+    for treatment in treatment_graph(patient_id):
+        for _, prescription in treatment["prescription_links"]:
+            prescriptions.append({
+                **prescription,
+                "doctor_info": treatment["doctor_info"],
+                "treatment_date": treatment["created_at"],
+                "treatment_id": treatment["id"],
+            })
+    return prescriptions
+
+
+def records_payload(patient_id):
+    """Diagnosis and prescription records, newest treatment first."""
+    records = []
+    for treatment in treatment_graph(patient_id):
+        treatment_id = treatment["id"]
+        treatment_date = treatment["created_at"]
+        doctor_info = treatment["doctor_info"]
+
+        for link_id, diagnosis in treatment["diagnosis_links"]:
+            code = diagnosis.get("diagnosis_code") or "UNKNOWN"
+            description = diagnosis.get("diagnosis_description") or treatment["treatment_notes"]
+            records.append({
+                "id": f"diagnosis_{diagnosis['id']}_{treatment_id}_{link_id}",
+                "type": "diagnosis",
+                "date": treatment_date,
+                "doctor": doctor_info,
+                "title": f"Diagnosis: {code} - {description}",
+                "description": description,
+                "status": "completed",
+                "treatment_id": treatment_id,
+                "diagnosis_details": diagnosis,
+                "diagnosis_code": code,
+            })
+
+        for link_id, prescription in treatment["prescription_links"]:
+            details = dict(prescription)
+            medication = details.pop("medication")
+            records.append({
+                "id": f"prescription_{prescription['id']}_{treatment_id}_{link_id}",
+                "type": "prescription",
+                "date": treatment_date,
+                "doctor": doctor_info,
+                "title": f"Prescription: {medication.get('name') or 'Unknown Medication'}",
+                "description": f"{details.get('dosage', '')} - {details.get('frequency', '')}",
+                "status": "completed",
+                "treatment_id": treatment_id,
+                "medication": medication,
+                "prescription_details": details,
+            })
+    return records
+
+
+def lab_results_payload(patient_id, image_url):
+    """Lab results with their request; image_url(file_path) builds the public link."""
+    from .models import LabResult
+
+    results = []
+    lab_results = LabResult.objects.filter(
+        lab_request__patient__patient_id=patient_id
+    ).select_related("lab_request")
+    for lab_result in lab_results:
+        file_path = lab_result.image.name if lab_result.image else ""
+        lab_request = lab_result.lab_request
+        results.append({
+            "id": lab_result.id,
+            "date": lab_result.uploaded_at.isoformat(),
+            "test_type": lab_request.test_name or lab_request.custom_test or "Laboratory Test",
+            "status": lab_request.status,
+            "image_url": image_url(file_path) if file_path else "",
+            # just the filename for display, without the folder prefix
+            "file_name": file_path.split("/")[-1],
+            "notes": "",
+            "request_date": lab_request.created_at.isoformat(),
+            "lab_request_id": lab_request.id,
+        })
+    return results
@@ -0,0 +1,116 @@
+"""
+Patient report (PatientReportview) assembled from the ORM.
+
+The report is read with a fixed number of queries regardless of how many
+treatments, diagnoses, prescriptions or lab results the patient has: one each
+for the patient, latest assessment, complaints, treatments (with doctor),
+treatment diagnoses, treatment prescriptions (with medicine) and lab results.
+
+The assembled report is cached under the patient's record version
+(patient.records) and a digest of the patient row. Every other input bumps the
+record version after commit: treatments and their diagnoses / prescriptions,
+lab requests and results, assessments and queue entries, and the names of the
+doctors and staff shown in it. Repeated views of an unchanged patient cost the
+patient query and a few cache reads.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+from queueing.models import PreliminaryAssessment, TemporaryStorageQueue
+from queueing.serializers import PreliminaryAssessmentBasicSerializer
+
+from .models import LabResult, Patient
+from .records import record_version, treatment_graph
+from .serializers import LabResultSerializer
+
+REPORT_CACHE_TIMEOUT = 60 * 60
+# bump when the shape of the report changes so cached reports are rebuilt
+REPORT_SCHEMA = 2
+
+
+def report_cache_key(patient_id, patient_info):
+    digest = hashlib.md5(repr(sorted(patient_info.items())).encode()).hexdigest()
+    return f"patient:report:{patient_id}:{REPORT_SCHEMA}:{record_version(patient_id)}:{digest}"
+
+
+def _treatments(patient_id):
+    """Treatments newest first, each with doctor_info, diagnoses and prescriptions."""
+    return [
+        {
+            "id": treatment["id"],
+            "treatment_notes": treatment["treatment_notes"],
+            "created_at": treatment["created_at"],
+            "updated_at": treatment["updated_at"],
+            "doctor_info": treatment["doctor_info"],
+            "diagnoses": [diagnosis for _, diagnosis in treatment["diagnosis_links"]],
+            "prescriptions": [prescription for _, prescription in treatment["prescription_links"]],
+        }
+        for treatment in treatment_graph(patient_id)
+    ]
+
+
+def _patient_info(patient_id):
+    return Patient.objects.filter(patient_id=patient_id).values().first()
+
+
+def assemble_report(patient_id, request=None, patient_info=None):
+    if patient_info is None:
+        patient_info = _patient_info(patient_id)
+
+    assessment_obj = PreliminaryAssessment.objects.filter(
+        patient__patient_id=patient_id
+    ).order_by("-assessment_date").first()
+    assessment_data = PreliminaryAssessmentBasicSerializer(assessment_obj).data if assessment_obj else None
+
+    complaints = list(
+        TemporaryStorageQueue.objects
+        .filter(patient_id=patient_id)
+        .order_by("-created_at")
+        .values_list("complaint", flat=True)
+    )
+
+    lab_results = (
+        LabResult.objects
+        .filter(lab_request__patient__patient_id=patient_id)
+        .select_related("submitted_by")
+    )
+    laboratories = LabResultSerializer(lab_results, many=True, context={"request": request}).data
+
+    report = {
+        "patient": patient_info,
+        "preliminary_assessment": assessment_data,
+        "recent_treatment": None,
+        "all_treatment_notes": [],
+        "all_prescriptions": [],
+        "all_diagnoses": [],
+        "laboratories": laboratories,
+        "complaint": complaints,
+    }
+
+    treatments = _treatments(patient_id)
+    if treatments:
+        all_diagnoses = [d for t in treatments for d in t["diagnoses"]]
+        notes = [t["treatment_notes"] for t in treatments if t["treatment_notes"]]
+        report.update({
+            "recent_treatment": treatments[0],
+            # deduplicated, first occurrence wins
+            "all_treatment_notes": list(dict.fromkeys(notes)),
+            "all_prescriptions": [p for t in treatments for p in t["prescriptions"]],
+            "all_diagnoses": list({d["id"]: d for d in all_diagnoses}.values()),
+        })
+    return report
+
+
+def patient_report(patient_id, request=None):
+    """The report for patient_id, from cache while the patient's records are unchanged."""
+    patient_info = _patient_info(patient_id)
+    if patient_info is None:
+        return assemble_report(patient_id, request)
+
+    key = report_cache_key(patient_id, patient_info)
+    report = cache.get(key)
+    if report is None:
+        report = assemble_report(patient_id, request, patient_info)
+        cache.set(key, report, REPORT_CACHE_TIMEOUT)
+    return report
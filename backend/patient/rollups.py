@@ -0,0 +1,278 @@
+"""
+Daily reporting rollups for the dashboard endpoints.
+
+Each tracked row (queue visit, lab result, diagnosis, prescription) counts
+towards exactly one rollup row, chosen by its day and grouping key. Saves and
+deletes move that contribution with F() increments in the same transaction
+as the write (see the receivers in patient.models and queueing.models);
+`manage.py rebuild_rollups` recomputes everything from the source tables
+(migration 0025_backfill_rollups ran it once to fill them).
+
+Reports read closed days from the rollups and aggregate the current day (and
+any future-dated rows) live, so a write the signals missed (bulk update, raw
+SQL, direct Supabase insert) can only affect today until the next rebuild.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Diagnosis, DiagnosisRollup, LabResult, LabResultRollup, MedicationRollup, Prescription, VisitRollup
+
+TOP_LIMIT = 10
+
+
+def normalize_description(text):
+    """Grouping form of a diagnosis description: lowercased, whitespace collapsed."""
+    return " ".join((text or "").lower().split())[:255]
+
+
+def _local_day(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value
+
+
+def _visit(row):
+    return {
+        "day": row["queue_date"],
+        "priority_level": row["priority_level"] or "",
+        "complaint": (row["complaint"] or "")[:100],
+    }, {"visits": 1}
+
+
+def _lab_result(row):
+    return {"day": _local_day(row["uploaded_at"])}, {"results": 1}
+
+
+def _diagnosis(row):
+    return {
+        "day": row["diagnosis_date"],
+        "description": normalize_description(row["diagnosis_description"]),
+    }, {"diagnoses": 1}
+
+
+def _prescription(row):
+    return {
+        "day": row["start_date"],
+        "medication_id": row["medication_id"],
+    }, {"quantity": row["quantity"] or 0, "prescriptions": 1}
+
+
+# source model -> (rollup model, fields that must be set, other fields read, row -> (key, amounts))
+SOURCES = {
+    "queueing.TemporaryStorageQueue": (VisitRollup, ("queue_date",), ("priority_level", "complaint"), _visit),
+    "patient.LabResult": (LabResultRollup, ("uploaded_at",), (), _lab_result),
+    "patient.Diagnosis": (DiagnosisRollup, ("diagnosis_date",), ("diagnosis_description",), _diagnosis),
+    "patient.Prescription": (MedicationRollup, ("start_date", "medication_id"), ("quantity",), _prescription),
+}
+
+
+def _fields(label):
+    _, required, optional, _ = SOURCES[label]
+    return required + optional
+
+
+def _contribution(label, row):
+    """(rollup model, key, amounts) for one source row, or None if it counts nowhere."""
+    rollup, required, _, contribution = SOURCES[label]
+    if row is None or any(row[field] is None for field in required):
+        return None
+    key, amounts = contribution(row)
+    return rollup, key, amounts
+
+
+def _apply(contribution, sign):
+    if contribution is None:
+        return
+    rollup, key, amounts = contribution
+    changes = {field: F(field) + sign * amount for field, amount in amounts.items()}
+    if rollup.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            rollup.objects.create(**key, **{field: sign * amount for field, amount in amounts.items()})
+    except IntegrityError:
+        # created concurrently since the update above
+        rollup.objects.filter(**key).update(**changes)
+
+
+def _row(label, instance):
+    return {field: getattr(instance, field) for field in _fields(label)}
+
+
+def _untouched(label, update_fields):
+    return update_fields is not None and not set(update_fields) & set(_fields(label))
+
+
+def remember_previous(sender, instance, update_fields=None):
+    """pre_save: keep the row as stored, so an edit can move its contribution."""
+    label = sender._meta.label
+    if instance._state.adding or instance.pk is None or _untouched(label, update_fields):
+        return
+    instance._rollup_previous = sender._base_manager.filter(pk=instance.pk).values(*_fields(label)).first()
+
+
+def record_saved(sender, instance, created, update_fields=None):
+    label = sender._meta.label
+    if not created and _untouched(label, update_fields):
+        return
+    previous = instance.__dict__.pop("_rollup_previous", None)
+    current = _row(label, instance)
+    if not created and previous == current:
+        return
+    if not created:
+        _apply(_contribution(label, previous), -1)
+    _apply(_contribution(label, current), +1)
+
+
+def record_deleted(sender, instance):
+    label = sender._meta.label
+    _apply(_contribution(label, _row(label, instance)), -1)
+
+
+def rebuild_rollups(registry=apps):
+    """
+    Recompute every rollup from the source tables. Returns {rollup name: rows written}.
+    `registry` is the app registry to load models from (a migration's historical apps).
+    """
+    written = {}
+    with transaction.atomic():
+        for label, (rollup, _, _, _) in SOURCES.items():
+            rollup = registry.get_model(rollup._meta.label)
+            grouped = defaultdict(Counter)
+            rows = registry.get_model(label)._base_manager.values(*_fields(label)).iterator(chunk_size=2000)
+            for row in rows:
+                contribution = _contribution(label, row)
+                if contribution is not None:
+                    _, key, amounts = contribution
+                    grouped[tuple(sorted(key.items()))].update(amounts)
+
+            rollup.objects.all().delete()
+            rollup.objects.bulk_create(
+                [rollup(**dict(key), **amounts) for key, amounts in grouped.items()],
+                batch_size=1000,
+            )
+            written[rollup.__name__] = len(grouped)
+    return written
+
+
+# --- reports: closed days from rollups, today onwards live ------------------
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _monthly(*day_counts):
+    """[{"month": "Jan 2025", "count": n}] from iterables of (day or month, count)."""
+    counts = Counter()
+    for rows in day_counts:
+        for day, count in rows:
+            counts[day.replace(day=1)] += count
+    return [
+        {"month": month.strftime("%b %Y"), "count": count}
+        for month, count in sorted(counts.items()) if count
+    ]
+
+
+def _in_range(queryset, field, start, end):
+    if start:
+        queryset = queryset.filter(**{f"{field}__gte": start})
+    if end:
+        queryset = queryset.filter(**{f"{field}__lte": end})
+    return queryset
+
+
+def monthly_visits(start=None, end=None):
+    from queueing.models import TemporaryStorageQueue
+
+    today = timezone.localdate()
+    closed = (
+        _in_range(VisitRollup.objects.filter(day__lt=today), "day", start, end)
+        .annotate(month=TruncMonth("day")).values("month")
+        .annotate(count=Sum("visits")).values_list("month", "count")
+    )
+    live = (
+        _in_range(TemporaryStorageQueue.objects.filter(queue_date__gte=today), "queue_date", start, end)
+        .values("queue_date").annotate(count=Count("id")).values_list("queue_date", "count")
+    )
+    return _monthly(closed, live)
+
+
+def monthly_lab_results(start=None, end=None):
+    today = timezone.localdate()
+    closed = (
+        _in_range(LabResultRollup.objects.filter(day__lt=today), "day", start, end)
+        .annotate(month=TruncMonth("day")).values("month")
+        .annotate(count=Sum("results")).values_list("month", "count")
+    )
+    live = LabResult.objects.filter(uploaded_at__gte=_start_of(today))
+    if start and start > today:
+        live = live.filter(uploaded_at__gte=_start_of(start))
+    live_days = [_local_day(uploaded_at) for uploaded_at in live.values_list("uploaded_at", flat=True)]
+    return _monthly(closed, [(day, 1) for day in live_days if not end or day <= end])
+
+
+def _top(rollup_totals, live_counts, limit):
+    """
+    The limit largest totals, given a callable returning closed-day totals for
+    some keys (None = the top `limit` keys) and the live counts. Any key outside
+    both the closed top and the live keys cannot outrank the closed top.
+    """
+    totals = Counter(dict(rollup_totals(None)))
+    if live_counts:
+        # closed totals of live keys outside the top; the top ones are already counted
+        others = [key for key in live_counts if key not in totals]
+        if others:
+            totals.update(dict(rollup_totals(others)))
+        totals.update(live_counts)
+    return totals.most_common(limit)
+
+
+def common_diseases(limit=TOP_LIMIT):
+    """[{"diagnosis_descriptions": text, "count": n}] for the most frequent diagnoses."""
+    today = timezone.localdate()
+
+    def closed(descriptions):
+        rows = DiagnosisRollup.objects.filter(day__lt=today)
+        if descriptions is not None:
+            rows = rows.filter(description__in=descriptions)
+        rows = (
+            rows.values("description")
+            .annotate(count=Sum("diagnoses"))
+            .order_by("-count", "description")
+            .values_list("description", "count")
+        )
+        return rows if descriptions is not None else rows[:limit]
+
+    live = Counter(
+        normalize_description(text)
+        for text in Diagnosis.objects.filter(diagnosis_date__gte=today).values_list("diagnosis_description", flat=True)
+    )
+    return [{"diagnosis_descriptions": description, "count": count} for description, count in _top(closed, live, limit)]
+
+
+def frequent_medications(limit=TOP_LIMIT):
+    """[{"medication__name": name, "prescription_count": quantity}] for the most prescribed medicines."""
+    today = timezone.localdate()
+
+    def closed(names):
+        rows = MedicationRollup.objects.filter(day__lt=today)
+        if names is not None:
+            rows = rows.filter(medication__name__in=names)
+        rows = (
+            rows.values("medication__name")
+            .annotate(quantity=Sum("quantity"))
+            .order_by("-quantity", "medication__name")
+            .values_list("medication__name", "quantity")
+        )
+        return rows if names is not None else rows[:limit]
+
+    live = Counter()
+    for name, quantity in Prescription.objects.filter(start_date__gte=today).values_list("medication__name", "quantity"):
+        live[name] += quantity or 0
+    return [{"medication__name": name, "prescription_count": quantity} for name, quantity in _top(closed, live, limit)]
@@ -0,0 +1,118 @@
+"""
+Patient search for the registration desk type-ahead.
+
+Matches the query as a substring of first name, last name, email or phone
+(served on PostgreSQL by the trigram indexes from migration 0023), or a
+month name against the birth month. Results are ranked by trigram similarity
+on PostgreSQL, and by prefix match elsewhere. They are paged with a keyset
+cursor over (score, patient_id) and capped at MAX_RESULTS per query.
+"""
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, DecimalField, FloatField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast, Greatest
+
+from queueing.models import TemporaryStorageQueue
+
+from .demographics import annotate_age
+from .models import Patient
+
+SEARCH_FIELDS = ("first_name", "last_name", "email", "phone_number")
+RESULT_FIELDS = (
+    "patient_id", "first_name", "middle_name", "last_name", "email", "phone_number",
+    "date_of_birth", "street_address", "barangay", "municipal_city",
+)
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+MAX_RESULTS = 200
+# scores are compared as numeric(7, 6): similarity() returns float4, which does
+# not round-trip through a float8 cursor value, so ties at a page boundary
+# would be repeated or skipped
+SCORE_FIELD = DecimalField(max_digits=7, decimal_places=6)
+
+MONTHS = {
+    'january': 1, 'february': 2, "march": 3, "april": 4, "may": 5, "june": 6,
+    "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12
+}
+
+
+def _score(query):
+    if connection.vendor == "postgresql":
+        score = Greatest(*[TrigramSimilarity(field, query) for field in SEARCH_FIELDS])
+    else:
+        # no trigram support: names starting with the query rank first
+        score = Case(
+            When(Q(first_name__istartswith=query) | Q(last_name__istartswith=query), then=Value(1.0)),
+            default=Value(0.5),
+            output_field=FloatField(),
+        )
+    return Cast(score, SCORE_FIELD)
+
+
+def encode_cursor(score, patient_id, served):
+    return base64.urlsafe_b64encode(json.dumps([str(score), patient_id, served]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    score, patient_id, served = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    try:
+        score = Decimal(str(score))
+    except InvalidOperation:
+        raise ValueError("Invalid cursor")
+    if not score.is_finite():
+        raise ValueError("Invalid cursor")
+    return score, str(patient_id), int(served)
+
+
+def search_patients(query, cursor=None, limit=PAGE_SIZE):
+    """
+    Return (patients, next_cursor) for one page of matches. Raises ValueError
+    for a malformed cursor.
+    """
+    query = (query or "").strip()
+    if not query:
+        return [], None
+
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f"{field}__icontains": query})
+    month_number = MONTHS.get(query.lower())
+    if month_number:
+        condition |= Q(date_of_birth__month=month_number)
+
+    latest_complaint = (
+        TemporaryStorageQueue.objects
+        .filter(patient=OuterRef("pk"))
+        .order_by("-created_at")
+        .values("complaint")[:1]
+    )
+    patients = (
+        annotate_age(Patient.objects.filter(condition))
+        .annotate(score=_score(query), complaint=Subquery(latest_complaint))
+        .order_by("-score", "patient_id")
+    )
+
+    served = 0
+    if cursor:
+        score, patient_id, served = decode_cursor(cursor)
+        patients = patients.filter(Q(score__lt=score) | Q(score=score, patient_id__gt=patient_id))
+
+    take = min(max(1, limit), MAX_PAGE_SIZE, MAX_RESULTS - served)
+    if take <= 0:
+        return [], None
+
+    # one extra row tells whether another page follows
+    rows = list(patients.values(*RESULT_FIELDS, "complaint", "age", "score")[:take + 1])
+    next_cursor = None
+    if len(rows) > take and served + take < MAX_RESULTS:
+        last = rows[take - 1]
+        next_cursor = encode_cursor(last["score"], last["patient_id"], served + take)
+
+    page = rows[:take]
+    for row in page:
+        del row["score"]
+    return page, next_cursor
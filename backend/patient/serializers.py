@@ -5,6 +5,7 @@ from django.conf import settings
 from rest_framework import serializers
 
 from .models import HealthTips, Patient, Diagnosis, Prescription, LabRequest, LabResult, HealthTips
+from .demographics import age_on
 
 from datetime import datetime, date
 from rest_framework import serializers
@@ -46,17 +47,15 @@ class PatientSerializer(serializers.Serializer):
     )
     
     def get_age(self, obj):
-        # Support both dicts and model instances
-        dob = obj.get('date_of_birth') if isinstance(obj, dict) else getattr(obj, 'date_of_birth', None)
-        if not dob:
-            return None
-        if isinstance(dob, str):
-            try:
-                dob = datetime.strptime(dob, "%Y-%m-%d").date()
-            except ValueError:
-                return None
-        today = date.today()
-        return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+        # Support both dicts and model instances; use the precomputed age when the
+        # view already added it (demographics.add_ages / annotate_age)
+        if isinstance(obj, dict):
+            if 'age' in obj:
+                return obj['age']
+            return age_on(obj.get('date_of_birth'))
+        if hasattr(obj, 'get_age'):
+            return obj.get_age()
+        return age_on(getattr(obj, 'date_of_birth', None))
 
 
     def get_queue_data(self, obj):
@@ -293,11 +292,9 @@ class PatientVisitSerializer(serializers.ModelSerializer):
         ]
 
     def get_treatment_created_at(self, obj):
-        # Get treatment data from the context (pre-fetched in bulk)
-        treatment_map = self.context.get('treatment_map', {})
-        if obj.patient and obj.patient.patient_id in treatment_map:
-            return treatment_map[obj.patient.patient_id]['created_at']
-        return None
+        # annotated by patient.visits.visits_queryset (latest treatment of the patient)
+        created_at = getattr(obj, 'latest_treatment_at', None)
+        return serializers.DateTimeField().to_representation(created_at) if created_at else None
         
     def get_patient_name(self, obj):
         patient = getattr(obj, "patient", None)
@@ -417,21 +414,26 @@ class PatientTreatmentsSerializer(serializers.ModelSerializer):
         patient = obj.patient
         
         # Get the latest completed queue entry for this patient
-        if patient and hasattr(patient, "temporarystoragequeue"):
+        if patient and hasattr(patient, "completed_entries"):
+            # prefetched by the view, newest first
+            latest_queue = patient.completed_entries[0] if patient.completed_entries else None
+        elif patient and hasattr(patient, "temporarystoragequeue"):
             latest_queue = patient.temporarystoragequeue.filter(
                 status='Completed'
             ).order_by('-created_at').first()
-            
-            if latest_queue:
-                return {
-                    "id": latest_queue.id,
-                    "priority_level": latest_queue.priority_level,
-                    "status": latest_queue.status,
-                    "created_at": latest_queue.created_at,
-                    "complaint": latest_queue.complaint,
-                    "queue_number": latest_queue.queue_number,
-                    "queue_date": latest_queue.queue_date,
-                }
+        else:
+            latest_queue = None
+
+        if latest_queue:
+            return {
+                "id": latest_queue.id,
+                "priority_level": latest_queue.priority_level,
+                "status": latest_queue.status,
+                "created_at": latest_queue.created_at,
+                "complaint": latest_queue.complaint,
+                "queue_number": latest_queue.queue_number,
+                "queue_date": latest_queue.queue_date,
+            }
         return None
 # Health tips serializer
 class GeneratedTipSerializer(serializers.Serializer):
@@ -25,6 +25,7 @@ urlpatterns = [
 
     # search patient
     path('patient/search-patients/', views.SearchPatient.as_view(), name='search-patient'),
+    path('patient/autocomplete/', views.PatientAutocomplete.as_view(), name='patient-autocomplete'),
     path('patient/get-queue/', views.GetQueue.as_view(), name='get-queue'),
     
     #laboratories
@@ -2,19 +2,17 @@ import boto3
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import Http404, FileResponse
+from django.http import Http404, FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models.functions import Lower
 from django.utils.timezone import now
 
 from queueing.serializers import PreliminaryAssessmentBasicSerializer, TemporaryStorageQueueSerializer
 from .serializers import DiagnosisSerializer, GenerateTipsRequestSerializer, GeneratedTipSerializer, PatientDiagnosisSerializer, PatientMedicalRecordSerializer, PatientSerializer, PatientRegistrationSerializer, LabRequestSerializer, LabResultSerializer, PatientTreatmentsSerializer, PatientVisitSerializer, PatientLabTestSerializer, CommonDiseasesSerializer, HealthTipsSerializer
-from queueing.models import  PreliminaryAssessment, TemporaryStorageQueue
+from queueing.models import  PreliminaryAssessment, QueueCounter, TemporaryStorageQueue
 from queueing.models import Treatment as TreatmentModel
 
 from datetime import datetime
-from django.db.models import Max
-from django.db.models import Q, Prefetch
+from django.db.models import OuterRef, Q, Prefetch, Subquery
 from patient.models import Patient, Prescription
 
 # Supabase credentials
@@ -34,20 +32,26 @@ from rest_framework.permissions import IsAuthenticated
 
 from rest_framework import generics
 from .models import HealthTips, LabRequest, LabResult, Diagnosis
+from .demographics import add_ages, age_on
+from .listing import patient_listing_response
+from .search import PAGE_SIZE as SEARCH_PAGE_SIZE, search_patients
+from .autocomplete import patient_index
+from .report import patient_report
+from .rollups import common_diseases, frequent_medications, monthly_lab_results, monthly_visits
+from .visits import month_range, visits_stream
+from .records import cached_record, lab_results_payload, prescriptions_payload, records_payload
+from backend.autocomplete import parse_limit
+from backend.concurrency import gather, iterate_async
+from backend.response_cache import cached_response
 from rest_framework.parsers import MultiPartParser, FormParser
 
 #reports
-from django.db.models import Count, Sum
-from django.db.models.functions import TruncMonth
 from django.utils.dateparse import parse_date
 from collections import defaultdict
 
 # create user
 from user.models import Doctor, UserAccount, create_user_id
 
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from queueing.utils import compute_queue_snapshot
 import logging
 
 from rest_framework.exceptions import PermissionDenied
@@ -59,118 +63,8 @@ class PatientListView(APIView):
 
     def get(self, request):
         try:
-            role = getattr(request.user, "role", None)
-            print(f"User role: {role}")
-            user_id = request.user.id
-            print(f"User ID: {user_id}")
-            
-            # Check if Supabase client is properly initialized
-            if supabase is None:
-                return Response(
-                    {"error": "Supabase client not configured"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-            
-            if role == "on-call-doctor" and user_id != "cooper-020006":
-                # Get unique patient IDs first from treatments
-                treatment_response = supabase.table("queueing_treatment").select(
-                    "patient_id"
-                ).eq("doctor_id", user_id).execute()
-                
-                # Handle both response object and dict
-                if hasattr(treatment_response, 'data'):
-                    treatment_data = treatment_response.data
-                elif isinstance(treatment_response, dict) and 'data' in treatment_response:
-                    treatment_data = treatment_response['data']
-                else:
-                    print(f"Unexpected treatment response: {treatment_response}")
-                    treatment_data = []
-                
-                patient_ids = list(set([t['patient_id'] for t in treatment_data if 'patient_id' in t]))
-                print(f"Found patient IDs for doctor {user_id}: {patient_ids}")
-                
-                if patient_ids:
-                    # Fetch patients using patient_id (the primary key)
-                    response = (
-                        supabase.table("patient_patient")
-                        .select("*, queueing_temporarystoragequeue(id, status, created_at, priority_level, queue_number, complaint)")
-                        .in_("patient_id", patient_ids)
-                        .execute()
-                    )
-                    
-                    # Handle both response object and dict
-                    if hasattr(response, 'data'):
-                        patients = response.data
-                    elif isinstance(response, dict) and 'data' in response:
-                        patients = response['data']
-                    else:
-                        print(f"Unexpected patient response: {response}")
-                        patients = []
-                else:
-                    patients = []
-                    
-            elif role in ["secretary", "admin"] or user_id == "cooper-020006":
-                # Get all patients using patient_id as the identifier
-                response = (
-                    supabase.table("patient_patient")
-                    .select("*, queueing_temporarystoragequeue(id, status, created_at, priority_level, queue_number, complaint)")
-                    .execute()
-                )
-                
-                # Handle both response object and dict
-                if hasattr(response, 'data'):
-                    patients = response.data
-                elif isinstance(response, dict) and 'data' in response:
-                    patients = response['data']
-                else:
-                    print(f"Unexpected all patients response: {response}")
-                    patients = []
-                
-            else: 
-                return Response(
-                    {"error": "Unauthorized role"}, 
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            # Remove duplicates using patient_id (the primary key)
-            unique_patients = {}
-            for patient in patients:
-                patient_id = patient.get('patient_id')
-                if patient_id and patient_id not in unique_patients:
-                    unique_patients[patient_id] = patient
-            
-            patients = list(unique_patients.values())
-            
-            # Process queue data for each patient and filter out "Waiting" status
-            filtered_patients = []
-            for patient in patients:
-                patient_id = patient.get('patient_id', 'unknown')
-                queue_list = patient.get('queueing_temporarystoragequeue') or []
-                
-                if queue_list:
-                    # Get the latest queue entry
-                    sorted_queue = sorted(
-                        queue_list,
-                        key=lambda q: q.get('created_at'),
-                        reverse=True
-                    )
-                    latest_queue = sorted_queue[0]
-                    patient['latest_queue'] = latest_queue
-                    print(f"Latest queue for patient {patient_id}: {latest_queue}")
-                    
-                    # Check if the latest status is "Waiting" - if so, skip this patient
-                    if latest_queue.get('status') == 'Waiting':
-                        print(f"Skipping patient {patient_id} because status is 'Waiting'")
-                        continue
-                else:
-                    patient['latest_queue'] = None
-                    print(f"No queue entries for patient {patient_id}.")
-                
-                # If we get here, the patient doesn't have "Waiting" status, so include them
-                filtered_patients.append(patient)
-
-            serializer = PatientSerializer(filtered_patients, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            # patients whose latest queue entry is still Waiting are left out
+            return patient_listing_response(request, exclude_waiting=True)
 
         except Exception as e:
             print("Exception occurred:", e)
@@ -215,96 +109,8 @@ class PatientFlowView(APIView):
 
     def get(self, request):
         try:
-            role = getattr(request.user, "role", None)
-            user_id = request.user.id
-            
-            if supabase is None:
-                return Response(
-                    {"error": "Supabase client not configured"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-            
-            if role == "on-call-doctor" and user_id != "cooper-020006":
-                # Get unique patient IDs first from treatments
-                treatment_response = supabase.table("queueing_treatment").select(
-                    "patient_id"
-                ).eq("doctor_id", user_id).execute()
-                
-                if hasattr(treatment_response, 'data'):
-                    treatment_data = treatment_response.data
-                elif isinstance(treatment_response, dict) and 'data' in treatment_response:
-                    treatment_data = treatment_response['data']
-                else:
-                    treatment_data = []
-                
-                patient_ids = list(set([t['patient_id'] for t in treatment_data if 'patient_id' in t]))
-                
-                if patient_ids:
-                    # Fetch ALL patients including those with waiting status
-                    response = (
-                        supabase.table("patient_patient")
-                        .select("*, queueing_temporarystoragequeue(id, status, created_at, priority_level, queue_number, complaint)")
-                        .in_("patient_id", patient_ids)
-                        .execute()
-                    )
-                    
-                    if hasattr(response, 'data'):
-                        patients = response.data
-                    elif isinstance(response, dict) and 'data' in response:
-                        patients = response['data']
-                    else:
-                        patients = []
-                else:
-                    patients = []
-                    
-            elif role in ["secretary", "admin"] or user_id == "cooper-020006":
-                # Get ALL patients including those with waiting status
-                response = (
-                    supabase.table("patient_patient")
-                    .select("*, queueing_temporarystoragequeue(id, status, created_at, priority_level, queue_number, complaint)")
-                    .execute()
-                )
-                
-                if hasattr(response, 'data'):
-                    patients = response.data
-                elif isinstance(response, dict) and 'data' in response:
-                    patients = response['data']
-                else:
-                    patients = []
-                
-            else: 
-                return Response(
-                    {"error": "Unauthorized role"}, 
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            
-            # Remove duplicates using patient_id (the primary key)
-            unique_patients = {}
-            for patient in patients:
-                patient_id = patient.get('patient_id')
-                if patient_id and patient_id not in unique_patients:
-                    unique_patients[patient_id] = patient
-            
-            patients = list(unique_patients.values())
-            
-            # Process queue data for each patient (NO FILTERING - include all statuses)
-            for patient in patients:
-                patient_id = patient.get('patient_id', 'unknown')
-                queue_list = patient.get('queueing_temporarystoragequeue') or []
-                
-                if queue_list:
-                    # Get the latest queue entry
-                    sorted_queue = sorted(
-                        queue_list,
-                        key=lambda q: q.get('created_at'),
-                        reverse=True
-                    )
-                    patient['latest_queue'] = sorted_queue[0]
-                else:
-                    patient['latest_queue'] = None
-
-            serializer = PatientSerializer(patients, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            # all patients, including those currently Waiting
+            return patient_listing_response(request)
 
         except Exception as e:
             print("Exception occurred:", e)
@@ -314,7 +120,22 @@ class PatientInfoView(APIView):
     
     def get(self, request, patient_id):
         try: 
-            response = supabase.table("patient_patient").select("*").eq("patient_id", patient_id).execute()
+            # patient, latest queue entry, latest treatment and appointments are independent
+            response, queue_response, treatment_response, appointment_response = gather(
+                lambda: supabase.table("patient_patient").select("*").eq("patient_id", patient_id).execute(),
+                lambda: supabase.table("queueing_temporarystoragequeue").select(
+                    "id, priority_level, created_at, queue_number, complaint, status"
+                ).eq("patient_id", patient_id).order("created_at", desc=True).execute(),
+                lambda: supabase.table("queueing_treatment").select(
+                    "id, treatment_notes, created_at, updated_at, patient_id, "
+                    "queueing_treatment_diagnoses(id, diagnosis_id, patient_diagnosis(*)), "
+                    "queueing_treatment_prescriptions(id, prescription_id, patient_prescription(*, medicine_medicine(id, name)))"
+                ).eq("patient_id", patient_id).order("created_at", desc=True).limit(1).execute(),
+                lambda: supabase.table('appointment_appointment').select(
+                    "appointment_date, status, doctor_id, "
+                    "appointment_appointmentreferral(id, reason)"
+                ).eq('patient_id', patient_id).order('appointment_date', desc=True).execute(),
+            )
             if hasattr(response, 'error') and response.error:
                 return Response({"error": response.error.message}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -322,19 +143,8 @@ class PatientInfoView(APIView):
             if not patient_data:
                 return Response({"error": "Patient not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            if patient_data.get("date_of_birth"):
-                try:
-                    patient_data['date_of_birth'] = datetime.strptime(patient_data["date_of_birth"], "%Y-%m-%d").date()
-                except Exception:
-                    patient_data["date_of_birth"] = None
-                    
-            patient_age = Patient(**patient_data)
-            patient_data['age'] = patient_age.get_age()
+            patient_data['age'] = age_on(patient_data.get("date_of_birth"))
             
-            # fetch latest queue data using supa
-            queue_response = supabase.table("queueing_temporarystoragequeue").select(
-                "id, priority_level, created_at, queue_number, complaint, status"
-            ).eq("patient_id", patient_id).order("created_at", desc=True).execute()
             queue_data = queue_response.data[0] if queue_response.data else None
             
             # fetch latest assessment
@@ -344,18 +154,7 @@ class PatientInfoView(APIView):
             assessment_data = PreliminaryAssessmentBasicSerializer(assessment_response).data if assessment_response else None
 
             print(assessment_data)
-            # fetch latest treatment with related diagnoses and prescriptions
-            treatment_response = supabase.table("queueing_treatment").select(
-                "id, treatment_notes, created_at, updated_at, patient_id, "
-                "queueing_treatment_diagnoses(id, diagnosis_id, patient_diagnosis(*)), "
-                "queueing_treatment_prescriptions(id, prescription_id, patient_prescription(*, medicine_medicine(id, name)))"
-            ).eq("patient_id", patient_id).order("created_at", desc=True).limit(1).execute()
-            
-            appointment_response = supabase.table('appointment_appointment').select(
-                "appointment_date, status, doctor_id, "
-                "appointment_appointmentreferral(id, reason)"
-            ).eq('patient_id', patient_id).order('appointment_date', desc=True).execute()
-            
+
             lab_result_obj = LabResult.objects.filter(lab_request__patient__patient_id=patient_id).order_by('-uploaded_at').first()
 
             if lab_result_obj is None:
@@ -481,13 +280,18 @@ class Treatment(APIView):
 
     def get(self, request): 
         try:
-            # 1. Fetch all treatment records from Supabase in a single query
-            treatment_response = supabase.table("queueing_treatment").select(
-                "id, treatment_notes, created_at, updated_at, patient_id, "
-                "patient_patient(*), "
-                "queueing_treatment_diagnoses(id, treatment_id, diagnosis_id, patient_diagnosis(*)), "
-                "queueing_treatment_prescriptions(id, treatment_id, prescription_id, patient_prescription(*))"
-            ).order("created_at", desc=True).execute()
+            # 1-2. Fetch all treatment records and all queue data, concurrently
+            treatment_response, queue_response = gather(
+                lambda: supabase.table("queueing_treatment").select(
+                    "id, treatment_notes, created_at, updated_at, patient_id, "
+                    "patient_patient(*), "
+                    "queueing_treatment_diagnoses(id, treatment_id, diagnosis_id, patient_diagnosis(*)), "
+                    "queueing_treatment_prescriptions(id, treatment_id, prescription_id, patient_prescription(*))"
+                ).order("created_at", desc=True).execute(),
+                lambda: supabase.table("queueing_temporarystoragequeue").select(
+                    "id, priority_level, status, created_at, queue_number, complaint, patient_id"
+                ).execute(),
+            )
 
             if hasattr(treatment_response, 'error') and treatment_response.error:
                 return Response({"error": treatment_response.error.message},
@@ -495,11 +299,6 @@ class Treatment(APIView):
 
             treatment_data = treatment_response.data
             
-            # 2. Fetch all queue data in a single query
-            queue_response = supabase.table("queueing_temporarystoragequeue").select(
-                "id, priority_level, status, created_at, queue_number, complaint, patient_id"
-            ).execute()
-            
             # Create a mapping of patient_id to their latest queue data
             queue_map = {}
             for queue_item in queue_response.data:
@@ -639,16 +438,28 @@ class PatientTreatmentListView(APIView):
 
             treatments_data = response.data  # All treatment records
 
+            # Latest queue entry of each treated patient, in one query
+            patient_ids = list(dict.fromkeys(item["patient_id"] for item in treatments_data))
+            latest_queue = dict.fromkeys(patient_ids)
+            latest_entry = (
+                TemporaryStorageQueue.objects
+                .filter(patient_id=OuterRef("patient_id"))
+                .order_by("-created_at")
+                .values("id")[:1]
+            )
+            queue_rows = (
+                TemporaryStorageQueue.objects
+                .filter(patient_id__in=patient_ids, id=Subquery(latest_entry))
+                .values("patient_id", "id", "priority_level", "status", "created_at", "queue_number", "complaint")
+            )
+            for queue in queue_rows:
+                latest_queue[queue.pop("patient_id")] = queue
+
             # Group treatments by patient_id
             grouped = {}
             for item in treatments_data:
                 pid = item["patient_id"]
-
-                # Fetch the latest queue data for this patient from the temporary storage queue
-                queue_response = supabase.table("queueing_temporarystoragequeue").select(
-                    "id, priority_level, status, created_at, queue_number, complaint"
-                ).eq("patient_id", pid).order("created_at", desc=True).execute()
-                queue_data = queue_response.data[0] if queue_response.data else None
+                queue_data = latest_queue[pid]
 
                 # Get patient info from the nested patient_patient object and add queue_data
                 patient_info = item.get("patient_patient", {})
@@ -687,20 +498,13 @@ class TreatmentDetailView(APIView):
         patient_id = kwargs.get('patient_id')
         
         try:
-            # 1. Fetch base patient information
-            patient_response = supabase.table("patient_patient").select("*").eq("patient_id", patient_id).execute()
-            if not patient_response.data:
-                return Response({"error": "Patient not found"}, status=status.HTTP_404_NOT_FOUND)
-            patient_data = patient_response.data[0]
-
-            # 2. Fetch latest queue information
-            queue_response = supabase.table("queueing_temporarystoragequeue").select(
-                "id, priority_level, status, created_at, queue_number"
-            ).eq("patient_id", patient_id).order("created_at", desc=True).execute()
-            queue_data = queue_response.data[0] if queue_response.data else None
-
-            # 3. Fetch treatments with related data
-            treatment_response = supabase.table("queueing_treatment").select(
+            # 1-3. Patient, latest queue entry and treatments, fetched concurrently
+            patient_response, queue_response, treatment_response = gather(
+                lambda: supabase.table("patient_patient").select("*").eq("patient_id", patient_id).execute(),
+                lambda: supabase.table("queueing_temporarystoragequeue").select(
+                    "id, priority_level, status, created_at, queue_number"
+                ).eq("patient_id", patient_id).order("created_at", desc=True).execute(),
+                lambda: supabase.table("queueing_treatment").select(
                 """
                 id, 
                 treatment_notes, 
@@ -726,7 +530,12 @@ class TreatmentDetailView(APIView):
                     patient_prescription(*, medicine_medicine(id, name))
                 )
                 """
-            ).eq("patient_id", patient_id).order("created_at", desc=True).execute()
+                ).eq("patient_id", patient_id).order("created_at", desc=True).execute(),
+            )
+            if not patient_response.data:
+                return Response({"error": "Patient not found"}, status=status.HTTP_404_NOT_FOUND)
+            patient_data = patient_response.data[0]
+            queue_data = queue_response.data[0] if queue_response.data else None
             treatments = treatment_response.data
 
             # 4. Structure response data
@@ -807,16 +616,7 @@ class PatientRegister(APIView):
         # generate queue number with daily reset + max 50 reset
         def generate_queue_number():
             today = now().date()
-            last_queue_number = TemporaryStorageQueue.objects.filter(
-                created_at__date=today
-            ).aggregate(Max('queue_number'))['queue_number__max']
-
-            if last_queue_number is None:
-                return 1
-            elif last_queue_number >= 50:
-                return 1
-            else:
-                return last_queue_number + 1
+            return QueueCounter.allocate(today, wrap=50)
 
         # Process complaint
         raw_complaint = request.data.get("complaint", "")
@@ -915,51 +715,30 @@ class SearchPatient(APIView):
     permission_classes = [IsMedicalStaff]
     def get(self, request, format=None):
         query = request.GET.get('q', '')
-        
-        # Prefetch the related TemporaryStorageQueue objects ordered by created_at (descending)
-        queue_prefetch = Prefetch(
-            'temporarystoragequeue',
-            queryset=TemporaryStorageQueue.objects.order_by('-created_at')
-        )
-        
-        months = {
-            'january': 1, 'february': 2, "march": 3, "april": 4, "may": 5, "june": 6,
-            "july": 7, "august": 8, "september": 9, "october": 10, "november": 11, "december": 12
-        }
-        month_number = months.get(query, None)
-        
-        if query:
-            patients = Patient.objects.filter(
-                Q(first_name__icontains=query) |
-                Q(last_name__icontains=query) |
-                Q(email__icontains=query) |
-                Q(phone_number__icontains=query) |
-                (Q(date_of_birth__isnull=False) & Q(date_of_birth__month=month_number) if month_number else Q()) |
-                Q(temporarystoragequeue__complaint__icontains=query)
-            ).distinct().prefetch_related(queue_prefetch)
-        else:
-            patients = Patient.objects.all().prefetch_related(queue_prefetch)
-        
-        data = []
-        for patient in patients:
-            # This returns the most recent queue entry because of our ordering
-            latest_queue = patient.temporarystoragequeue.first()
-            data.append({
-                'patient_id': patient.patient_id,
-                'first_name': patient.first_name,
-                'middle_name': patient.middle_name,
-                'last_name': patient.last_name,
-                'email': patient.email,
-                'phone_number': patient.phone_number,
-                'date_of_birth': patient.date_of_birth.strftime('%Y-%m-%d'),
-                'street_address': patient.street_address,
-                'barangay': patient.barangay,
-                'municipal_city': patient.municipal_city,
-                'complaint': latest_queue.complaint if latest_queue else None,
-                'age': patient.get_age(),
-            })
 
-        return Response({'patients': data}, status=status.HTTP_200_OK)
+        try:
+            limit = int(request.GET.get('limit', SEARCH_PAGE_SIZE))
+            patients, next_cursor = search_patients(query, cursor=request.GET.get('cursor'), limit=limit)
+        except (ValueError, TypeError):
+            return Response({'error': 'Invalid limit or cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({'patients': patients, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+class PatientAutocomplete(APIView):
+    """Type-ahead for the registration desk, served from the in-process index (patient.autocomplete)."""
+    permission_classes = [IsMedicalStaff]
+    def get(self, request, format=None):
+        try:
+            limit = parse_limit(request.GET.get('limit'))
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            matches = patient_index.search(request.GET.get('q', ''), limit=limit)
+            patients = add_ages([dict(patient) for patient in matches])
+            return Response({'patients': patients}, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"error": str(e)}, status=500)
 
 class GetQueue(APIView):
     permission_classes = [IsMedicalStaff]
@@ -1085,23 +864,7 @@ class AcceptButton(APIView):
             queue_entry.save()
             print("✅ Queue entry status updated to:", queue_entry.status)
 
-            # Broadcast updated snapshot
-            print("🔄 Computing queue snapshot...")
-            snapshot = compute_queue_snapshot()
-            print("📊 Queue snapshot computed:", snapshot)
-            
-            channel_layer = get_channel_layer()
-            print("📡 Broadcasting WebSocket update to 'registration_queue' group...")
-            
-            async_to_sync(channel_layer.group_send)(
-                "registration_queue",
-                {
-                    "type": "queue_update",
-                    "data": snapshot,
-                }
-            )
-            
-            print("✅ WebSocket broadcast completed")
+            # Displays are notified by the queue post_save signal (queueing.broadcast)
 
             return Response({
                 "message": "Status updated successfully",
@@ -1204,7 +967,7 @@ class LabResultCreateView(generics.CreateAPIView):
         if not file_obj:
             raise APIException("No image file provided")
 
-        if supabase is None:
+        if not supabase:
             logger.error("Supabase service client is not configured.")
             raise APIException("Server storage misconfiguration")
 
@@ -1488,136 +1251,7 @@ class PatientReportview(APIView):
 
     def get(self, request, patient_id):
         try:
-            # Fetch patient
-            response = supabase.table("patient_patient").select("*").eq("patient_id", patient_id).execute()
-            if hasattr(response, 'error') and response.error:
-                error_msg = getattr(response.error, 'message', 'Unknown error')
-                return Response({"error": error_msg}, status=status.HTTP_400_BAD_REQUEST)
-            patient_info = response.data[0] if response.data else None
-
-            # Fetch latest preliminary assessment
-            assessment_obj = PreliminaryAssessment.objects.filter(
-                patient__patient_id=patient_id
-            ).order_by("-assessment_date").first()
-            assessment_data = PreliminaryAssessmentBasicSerializer(assessment_obj).data if assessment_obj else None
-
-            # Fetch all complaints
-            complaint_resp = supabase.table("queueing_temporarystoragequeue") \
-                .select("complaint") \
-                .eq("patient_id", patient_id) \
-                .order("created_at", desc=True) \
-                .execute()
-            complaints = [r.get("complaint") for r in (complaint_resp.data or [])] if not getattr(complaint_resp, 'error', False) else []
-
-            # Fetch treatments
-            treatment_response = supabase.table("queueing_treatment").select(
-                """
-                id, 
-                treatment_notes, 
-                created_at, 
-                updated_at, 
-                patient_id,             
-                doctor_id(
-                    id,
-                    first_name,
-                    last_name,
-                    user_doctor(specialization)
-                ),
-                queueing_treatment_diagnoses(
-                    id,
-                    treatment_id,
-                    diagnosis_id,
-                    patient_diagnosis(*)
-                ),
-                queueing_treatment_prescriptions(
-                    id,
-                    treatment_id,
-                    prescription_id,
-                    patient_prescription(*, medicine_medicine(id, name))
-                )
-            """
-            ).eq("patient_id", patient_id).order("created_at", desc=True).execute()
-            treatments = treatment_response.data or []
-
-            # Fetch laboratory results
-            lab_results_qs = LabResult.objects.filter(lab_request__patient__patient_id=patient_id)
-            lab_results_serialized = LabResultSerializer(lab_results_qs, many=True, context={'request': request}).data if lab_results_qs.exists() else []
-
-            all_diagnoses = []
-            all_prescriptions = []
-            all_treatment_notes = []
-
-            patient_report = {
-                "patient": patient_info,
-                "preliminary_assessment": assessment_data,
-                "recent_treatment": None,
-                "all_treatment_notes": [],
-                "all_prescriptions": [],
-                "all_diagnoses": [],
-                "laboratories": lab_results_serialized,
-                "complaint": complaints
-            }
-
-            if treatments:
-                transformed_treatments = []
-
-                for item in treatments:
-                    # Doctor info
-                    raw_doc = item.get("doctor_id") or {}
-                    raw_profile = raw_doc.get("user_doctor") or {}
-                    doctor_info = {
-                        "id": raw_doc.get("id"),
-                        "name": " ".join(filter(None, [raw_doc.get("first_name"), raw_doc.get("last_name")])),
-                        "specialization": raw_profile.get("specialization")
-                    }
-
-                    # Diagnoses
-                    diagnoses = [
-                        d["patient_diagnosis"]
-                        for d in item.get("queueing_treatment_diagnoses", [])
-                        if d.get("patient_diagnosis")
-                    ]
-                    all_diagnoses.extend(diagnoses)
-
-                    # Prescriptions
-                    prescriptions = []
-                    for p in item.get("queueing_treatment_prescriptions", []):
-                        presc = p.get("patient_prescription")
-                        if presc:
-                            med = presc.pop("medicine_medicine", None)
-                            prescriptions.append({**presc, "medication": med})
-                    all_prescriptions.extend(prescriptions)
-
-                    # Treatment notes
-                    note = item.get("treatment_notes")
-                    if note:
-                        all_treatment_notes.append(note)
-
-                    # Transform each treatment
-                    transformed_treatments.append({
-                        "id": item.get("id"),
-                        "treatment_notes": item.get("treatment_notes"),
-                        "created_at": item.get("created_at"),
-                        "updated_at": item.get("updated_at"),
-                        "doctor_info": doctor_info,
-                        "diagnoses": diagnoses,
-                        "prescriptions": prescriptions
-                    })
-
-                # Deduplicate diagnoses by 'id'
-                unique_diagnoses = {d['id']: d for d in all_diagnoses}.values()
-                # Deduplicate treatment notes
-                unique_treatment_notes = list(dict.fromkeys(all_treatment_notes))
-
-                patient_report.update({
-                    "recent_treatment": transformed_treatments[0],
-                    "all_treatment_notes": unique_treatment_notes,
-                    "all_prescriptions": all_prescriptions,
-                    "all_diagnoses": list(unique_diagnoses)
-                })
-
-            return Response(patient_report, status=status.HTTP_200_OK)
-
+            return Response(patient_report(patient_id, request), status=status.HTTP_200_OK)
         except Exception as e:
             print("Exception ", e)
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -1632,66 +1266,21 @@ class MonthlyVisitsAPIView(APIView):
         start_date = parse_date(str(start_raw)) if start_raw else None
         end_date = parse_date(str(end_raw)) if end_raw else None
 
-
-        queryset = TemporaryStorageQueue.objects.all()
-
-        if start_date and end_date:
-            queryset = queryset.filter(created_at__date__range=(start_date, end_date))
-        elif start_date:
-            queryset = queryset.filter(created_at__date__gte=start_date)
-        elif end_date:
-            queryset = queryset.filter(created_at__date__lte=end_date)
-
-        # Annotate with truncated month (creates a temporary alias, not a model field)
-        monthly_data = (
-            queryset
-            .annotate(report_month=TruncMonth('created_at'))
-            .values('report_month')
-            .annotate(count=Count('id'))
-            .order_by('report_month')
-        )
-
-        result = [
-            {
-                "month": entry["report_month"].strftime("%b %Y"),
-                "count": entry["count"]
-            }
-            for entry in monthly_data if entry["report_month"]
-        ]
-
-        return Response(result)
+        # closed days come from the visit rollup, today is counted live
+        return Response(monthly_visits(start_date, end_date))
 
 class MonthlyPatientVisitsDetailedView(APIView):
+    permission_classes = [IsDoctorOrOnCallDoctor | isSecretary | isAdmin]
+
     def get(self, request):
-        # Optimize query with select_related to prevent N+1 queries
-        visits = TemporaryStorageQueue.objects.select_related('patient').all().order_by("queue_date")
-        
-        # Get all patient IDs to fetch treatments in bulk
-        patient_ids = [visit.patient.patient_id for visit in visits if visit.patient]
-        
-        # Fetch treatments in bulk from Supabase
-        treatment_map = {}
-        if patient_ids:
-            treatment_response = supabase.table("queueing_treatment").select(
-                "id, created_at, patient_id"
-            ).in_("patient_id", patient_ids).execute()
-            
-            # Create a mapping of patient_id to latest treatment
-            for treatment in treatment_response.data:
-                patient_id = treatment['patient_id']
-                if patient_id not in treatment_map or treatment['created_at'] > treatment_map[patient_id]['created_at']:
-                    treatment_map[patient_id] = treatment
-        
-        serializer = PatientVisitSerializer(visits, many=True, context={'treatment_map': treatment_map})
-
-        grouped_visits = defaultdict(list)
-        for visit in serializer.data:
-            visit_date = visit.get("visit_date")
-            if visit_date:
-                month = visit_date[:7]
-                grouped_visits[month].append(visit)
-                
-        return Response(dict(grouped_visits))
+        try:
+            start, stop = month_range(request.query_params.get("start"), request.query_params.get("end"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # {"YYYY-MM": [visit, ...]} streamed in batches, so memory stays flat; the
+        # iterator must be async or Daphne buffers the whole body first
+        return StreamingHttpResponse(iterate_async(visits_stream(start, stop)), content_type="application/json")
 
     
 class MonthlyLabResultAPIView(APIView):
@@ -1703,52 +1292,19 @@ class MonthlyLabResultAPIView(APIView):
         start_date = parse_date(str(start_raw)) if start_raw else None
         end_date = parse_date(str(end_raw)) if end_raw else None
 
-
-        queryset = LabResult.objects.all()
-
-        if start_date and end_date:
-            queryset = queryset.filter(created_at__date__range=(start_date, end_date))
-        elif start_date:
-            queryset = queryset.filter(created_at__date__gte=start_date)
-        elif end_date:
-            queryset = queryset.filter(created_at__date__lte=end_date)
-
-        # Annotate with truncated month (creates a temporary alias, not a model field)
-        monthly_data = (
-            queryset
-            .annotate(report_month=TruncMonth('uploaded_at'))
-            .values('report_month')
-            .annotate(count=Count('id'))
-            .order_by('report_month')
-        )
-
-        result = [
-            {
-                "month": entry["report_month"].strftime("%b %Y"),
-                "count": entry["count"]
-            }
-            for entry in monthly_data if entry["report_month"]
-        ]
-
-        return Response(result)
+        # by upload day; closed days come from the lab result rollup
+        return Response(monthly_lab_results(start_date, end_date))
     
 class CommonDiseasesReportAPIView(APIView):
     permission_classes = [IsMedicalStaff]
 
     def get(self, request):
-        common_diseases = (
-            Diagnosis.objects
-            .annotate(diagnosis_descriptions=Lower("diagnosis_description"))
-            .values("diagnosis_descriptions")
-            .annotate(count=Count("id"))
-            .order_by("-count")[:10]
-        )
-
-        return Response(common_diseases)
+        return Response(common_diseases())
     
 class TotalPatientsAPIView(APIView):
     permission_classes = [IsMedicalStaff]
 
+    @cached_response(scope="role", depends_on=["patient.Patient"])
     def get(self, request):
         try:
             response = supabase.table("patient_patient").select("*").execute()
@@ -1760,7 +1316,7 @@ class TotalPatientsAPIView(APIView):
                 )
 
             patients = response.data
-            serializer = PatientSerializer(patients, many=True)
+            serializer = PatientSerializer(add_ages(patients), many=True)
 
             return Response({
                 "count": len(patients),
@@ -1780,8 +1336,9 @@ class MonthlyLabTestView(generics.ListAPIView):
             raise Http404("No Lab Results found for the given patient.")
         return queryset
 
+    @cached_response(scope="role", depends_on=["patient.LabResult", "patient.LabRequest", "user.UserAccount"])
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        queryset = self.get_queryset().select_related("lab_request__requested_by", "submitted_by")
         serializer = self.get_serializer(queryset, many=True)
         return Response({"lab_results": serializer.data})
 
@@ -1796,6 +1353,10 @@ class CommonDiseasesView(generics.ListAPIView):
             'diagnoses'  
         ).all()
 
+    @cached_response(
+        scope="role",
+        depends_on=["queueing.Treatment", "patient.Diagnosis", "patient.Patient", "user.UserAccount"],
+    )
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
         
@@ -1811,17 +1372,8 @@ class CommonDiseasesView(generics.ListAPIView):
 class FrequentMedicationsView(generics.ListAPIView):
     permission_classes = [IsMedicalStaff]
 
-    def get_queryset(self):
-        return (
-            Prescription.objects
-            .values('medication__name')
-            .annotate(prescription_count=Sum('quantity'))
-            .order_by('-prescription_count')[:10]
-        )
-
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        return Response({"medicines": queryset}, status=status.HTTP_200_OK)
+        return Response({"medicines": frequent_medications()}, status=status.HTTP_200_OK)
         
 class PatientTreatmentRecordsView(APIView):
     permission_classes = [IsAuthenticated, IsMe]
@@ -1850,62 +1402,9 @@ class PatientMyPrescriptionsView(APIView):
         try:
             # Get patient_id from the logged-in user's patient profile
             patient_id = request.user.patient_profile.patient_id
-            
-            # Fetch treatments with prescriptions for this patient - REMOVED description
-            treatment_response = supabase.table("queueing_treatment").select(
-                """
-                id, 
-                created_at, 
-                updated_at, 
-                doctor_id(
-                    id,
-                    first_name,
-                    last_name,
-                    user_doctor(specialization)
-                ),
-                queueing_treatment_prescriptions(
-                    id, 
-                    treatment_id, 
-                    prescription_id, 
-                    patient_prescription(*, medicine_medicine(id, name))
-                )
-                """
-            ).eq("patient_id", patient_id).order("created_at", desc=True).execute()
-            
-            treatments = treatment_response.data
-
-            # Extract and flatten all prescriptions
-            all_prescriptions = []
-            for treatment in treatments:
-                # Safe doctor info extraction
-                raw_doc = treatment.get("doctor_id") or {}
-                raw_profile = raw_doc.get("user_doctor") or {}
-                
-                doctor_info = {
-                    "id": raw_doc.get("id"),
-                    "name": " ".join(filter(None, [raw_doc.get("first_name"), raw_doc.get("last_name")])),
-                    "specialization": raw_profile.get("specialization")
-                }
-
-                # Process prescriptions for this treatment
-                for prescription_relation in treatment.get("queueing_treatment_prescriptions", []):
-                    prescription_data = prescription_relation.get("patient_prescription")
-                    if not prescription_data:
-                        continue
-                    
-                    medication_data = prescription_data.pop("medicine_medicine", {})
-                    
-                    prescription_entry = {
-                        **prescription_data,
-                        "medication": medication_data,
-                        "doctor_info": doctor_info,
-                        "treatment_date": treatment.get("created_at"),
-                        "treatment_id": treatment.get("id")
-                    }
-                    all_prescriptions.append(prescription_entry)
 
-            # Sort prescriptions by date (newest first)
-            all_prescriptions.sort(key=lambda x: x.get("treatment_date", ""), reverse=True)
+            # newest treatment first; cached until the patient's record changes
+            all_prescriptions = cached_record(patient_id, "prescriptions", lambda: prescriptions_payload(patient_id))
 
             return Response({
                 "prescriptions": all_prescriptions,
@@ -1923,127 +1422,9 @@ class PatientRecordsView(APIView):
     def get(self, request, *args, **kwargs):
         try:
             patient_id = request.user.patient_profile.patient_id
-            
-            # Fetch treatments with both prescriptions and diagnoses
-            treatment_response = supabase.table("queueing_treatment").select(
-                """
-                id, 
-                treatment_notes, 
-                created_at, 
-                updated_at, 
-                doctor_id(
-                    id,
-                    first_name,
-                    last_name,
-                    user_doctor(specialization)
-                ),
-                queueing_treatment_diagnoses(
-                    id, 
-                    treatment_id, 
-                    diagnosis_id, 
-                    patient_diagnosis(*)
-                ), 
-                queueing_treatment_prescriptions(
-                    id, 
-                    treatment_id, 
-                    prescription_id, 
-                    patient_prescription(*, medicine_medicine(id, name))
-                )
-                """
-            ).eq("patient_id", patient_id).order("created_at", desc=True).execute()
-            
-            treatments = treatment_response.data
-            print(f"Found {len(treatments)} treatments for patient {patient_id}")
 
-            records = []
-            seen_ids = set()  # Track seen IDs to prevent duplicates
-            
-            for treatment in treatments:
-                # Safe doctor info extraction
-                raw_doc = treatment.get("doctor_id") or {}
-                raw_profile = raw_doc.get("user_doctor") or {}
-                
-                doctor_info = {
-                    "id": raw_doc.get("id"),
-                    "name": " ".join(filter(None, [raw_doc.get("first_name"), raw_doc.get("last_name")])),
-                    "specialization": raw_profile.get("specialization")
-                }
-
-                treatment_date = treatment.get("created_at")
-                treatment_notes = treatment.get("treatment_notes", "")
-                treatment_id_val = treatment.get("id")
-                
-                # Process diagnoses for this treatment
-                for diagnosis_relation in treatment.get("queueing_treatment_diagnoses", []):
-                    diagnosis_data = diagnosis_relation.get("patient_diagnosis")
-                    if diagnosis_data:
-                        # Create unique ID using both diagnosis ID and treatment ID
-                        diagnosis_id = diagnosis_data.get('id')
-                        relation_id = diagnosis_relation.get('id')
-                        
-                        # Use multiple components to ensure uniqueness
-                        record_id = f"diagnosis_{diagnosis_id}_{treatment_id_val}_{relation_id}"
-                        
-                        # Skip if we've already seen this exact record
-                        if record_id in seen_ids:
-                            continue
-                        seen_ids.add(record_id)
-                        
-                        # Extract diagnosis code and description
-                        diagnosis_code = diagnosis_data.get("diagnosis_code") or diagnosis_data.get("code") or "UNKNOWN"
-                        diagnosis_description = diagnosis_data.get("diagnosis_description") or diagnosis_data.get("description") or diagnosis_data.get("diagnosis_notes") or treatment_notes
-                        
-                        # Format title as "Diagnosis: LVRCNCR - Liver Cancer"
-                        diagnosis_title = f"Diagnosis: {diagnosis_code} - {diagnosis_description}"
-                        
-                        record = {
-                            "id": record_id,
-                            "type": "diagnosis",
-                            "date": treatment_date,
-                            "doctor": doctor_info,
-                            "title": diagnosis_title,
-                            "description": diagnosis_description,
-                            "status": "completed",
-                            "treatment_id": treatment_id_val,
-                            "diagnosis_details": diagnosis_data,
-                            "diagnosis_code": diagnosis_code
-                        }
-                        records.append(record)
-
-                # Process prescriptions for this treatment
-                for prescription_relation in treatment.get("queueing_treatment_prescriptions", []):
-                    prescription_data = prescription_relation.get("patient_prescription")
-                    if prescription_data:
-                        medication_data = prescription_data.pop("medicine_medicine", {})
-                        medication_name = medication_data.get('name', 'Unknown Medication')
-                        
-                        # Create unique ID using prescription ID, treatment ID, and relation ID
-                        prescription_id = prescription_data.get('id')
-                        relation_id = prescription_relation.get('id')
-                        
-                        record_id = f"prescription_{prescription_id}_{treatment_id_val}_{relation_id}"
-                        
-                        # Skip if we've already seen this exact record
-                        if record_id in seen_ids:
-                            continue
-                        seen_ids.add(record_id)
-                        
-                        record = {
-                            "id": record_id,
-                            "type": "prescription",
-                            "date": treatment_date,
-                            "doctor": doctor_info,
-                            "title": f"Prescription: {medication_name}",
-                            "description": f"{prescription_data.get('dosage', '')} - {prescription_data.get('frequency', '')}",
-                            "status": "completed",
-                            "treatment_id": treatment_id_val,
-                            "medication": medication_data,
-                            "prescription_details": prescription_data
-                        }
-                        records.append(record)
-
-            # Sort all records by date (newest first)
-            records.sort(key=lambda x: x.get("date", ""), reverse=True)
+            # diagnoses and prescriptions, newest treatment first
+            records = cached_record(patient_id, "records", lambda: records_payload(patient_id))
 
             return Response({
                 "records": records,
@@ -2079,40 +1460,12 @@ class PatientLabResultsView(APIView):
     def get(self, request, *args, **kwargs):
         try:
             patient_id = request.user.patient_profile.patient_id
-            
-            # Fetch lab results
-            lab_results_qs = LabResult.objects.filter(
-                lab_request__patient__patient_id=patient_id
-            ).select_related('lab_request')
-            
-            processed_results = []
-            
-            for lab_result in lab_results_qs:
-                # Get the file path from the image field - this is what we updated in the database
-                file_path = lab_result.image.name if lab_result.image else ""
-                
-                # Generate URL using the actual file path from database
-                image_url = self.get_supabase_public_url(file_path) if file_path else ""
-                
-                lab_request = lab_result.lab_request
-                test_type = lab_request.test_name or lab_request.custom_test or 'Laboratory Test'
-                
-                # Extract just the filename for display (without the "unknown/" prefix)
-                file_name = file_path.split("/")[-1] if "/" in file_path else file_path
-                
-                result = {
-                    "id": lab_result.id,
-                    "date": lab_result.uploaded_at.isoformat(),
-                    "test_type": test_type,
-                    "status": lab_request.status,
-                    "image_url": image_url,
-                    "file_name": file_name,
-                    "notes": "",
-                    "request_date": lab_request.created_at.isoformat(),
-                    "lab_request_id": lab_request.id
-                }
-                processed_results.append(result)
-            
+
+            processed_results = cached_record(
+                patient_id, "lab_results",
+                lambda: lab_results_payload(patient_id, self.get_supabase_public_url),
+            )
+
             return Response({
                 "lab_results": processed_results,
                 "total_count": len(processed_results),
@@ -2135,7 +1488,19 @@ class MyTreatmentsView(APIView):
         elif user.role == 'on-call-doctor':
             treatments = TreatmentModel.objects.filter(doctor=user).distinct() 
             
-        treatments = treatments.filter(diagnoses__isnull=False).distinct()
+        # patient, doctor, diagnoses and completed visits in three queries, not per row
+        treatments = (
+            treatments.filter(diagnoses__isnull=False).distinct()
+            .select_related('patient', 'doctor')
+            .prefetch_related(
+                'diagnoses',
+                Prefetch(
+                    'patient__temporarystoragequeue',
+                    queryset=TemporaryStorageQueue.objects.filter(status='Completed').order_by('-created_at'),
+                    to_attr='completed_entries',
+                ),
+            )
+        )
         serializer = PatientTreatmentsSerializer(treatments, many=True)
         
         return Response({
@@ -0,0 +1,111 @@
+"""
+Monthly patient visit details (MonthlyPatientVisitsDetailedView).
+
+Visits in a month range are read in (queue_date, id) order, EXPORT_BATCH_SIZE
+rows at a time, with each patient's latest treatment time annotated by a
+correlated subquery, and streamed (one chunk per batch, fetched off the event
+loop by backend.concurrency.iterate_async) as one JSON object grouped by month:
+
+  GET ...?start=2025-01&end=2025-06
+    -> {"2025-01": [visit, ...], "2025-02": [...], ...}
+
+start / end are months (YYYY-MM, or any date in the month). Without them the
+last DEFAULT_MONTHS months up to the current one are returned; a range may
+span at most MAX_MONTHS months.
+"""
+import json
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from queueing.models import TemporaryStorageQueue, Treatment
+
+from .serializers import PatientVisitSerializer
+
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 24
+EXPORT_BATCH_SIZE = 500
+
+
+def parse_month(value):
+    """First day of the month named by YYYY-MM or YYYY-MM-DD; ValueError otherwise."""
+    value = str(value).strip()
+    day = parse_date(f"{value}-01" if len(value) == 7 else value)
+    if day is None:
+        raise ValueError(f"Invalid month: {value}")
+    return day.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_range(start_raw=None, end_raw=None):
+    """(first day of start month, first day after end month); ValueError on bad input."""
+    end = parse_month(end_raw) if end_raw else timezone.localdate().replace(day=1)
+    start = parse_month(start_raw) if start_raw else add_months(end, 1 - DEFAULT_MONTHS)
+    if start > end:
+        raise ValueError("start must not be after end")
+    if add_months(start, MAX_MONTHS) <= end:
+        raise ValueError(f"A range may span at most {MAX_MONTHS} months")
+    return start, add_months(end, 1)
+
+
+def visits_queryset(start, stop):
+    latest_treatment = (
+        Treatment.objects
+        .filter(patient_id=OuterRef("patient_id"))
+        .order_by("-created_at")
+        .values("created_at")[:1]
+    )
+    return (
+        TemporaryStorageQueue.objects
+        .filter(queue_date__gte=start, queue_date__lt=stop)
+        .select_related("patient")
+        .only(
+            "id", "priority_level", "status", "complaint", "queue_number", "queue_date", "created_at",
+            "patient__patient_id", "patient__first_name", "patient__last_name",
+        )
+        .annotate(latest_treatment_at=Subquery(latest_treatment))
+        .order_by("queue_date", "id")
+    )
+
+
+def visit_batches(queryset):
+    """Serialized visits, EXPORT_BATCH_SIZE at a time, keyset-paginated on (queue_date, id)."""
+    last = None
+    while True:
+        batch = queryset
+        if last is not None:
+            batch = batch.filter(Q(queue_date__gt=last.queue_date) | Q(queue_date=last.queue_date, id__gt=last.id))
+        visits = list(batch[:EXPORT_BATCH_SIZE])
+        if visits:
+            yield PatientVisitSerializer(visits, many=True).data
+        if len(visits) < EXPORT_BATCH_SIZE:
+            break
+        last = visits[-1]
+
+
+def visits_stream(start, stop):
+    """
+    Yield {"YYYY-MM": [visit, ...], ...} in month order, one chunk per batch,
+    so only one batch is in memory at a time (wrap in iterate_async to serve it).
+    """
+    yield "{"
+    month = None
+    for visits in visit_batches(visits_queryset(start, stop)):
+        parts = []
+        for visit in visits:
+            visit_month = visit["visit_date"][:7]
+            if visit_month != month:
+                parts.append(("" if month is None else "],") + json.dumps(visit_month) + ":[")
+                month = visit_month
+                separator = ""
+            parts.append(separator + json.dumps(visit, cls=DjangoJSONEncoder))
+            separator = ","
+        yield "".join(parts)
+    yield "}" if month is None else "]}"
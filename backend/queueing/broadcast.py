@@ -0,0 +1,215 @@
+"""
+Push queue changes to the WebSocket displays, one channel per queue stage.
+
+Groups:
+  registration_queue        - legacy registration clients, receive the full snapshot
+                              on every change (computed only while any are connected)
+  registration_queue_delta  - registration clients that connect with ?protocol=delta
+  assessment_queue          - ws/queue/assessment/ (Queued for Assessment)
+  treatment_queue           - ws/queue/treatment/  (Queued for Treatment)
+  lab_queue                 - ws/queue/lab/        (Ongoing for Laboratory)
+
+Every group except the legacy one speaks the delta protocol: a snapshot on connect
+and then small sequenced deltas, each stage with its own seq counter. A screen only
+receives the stage it renders.
+
+Delta messages (JSON):
+  {"type": "snapshot", "seq": n, "data": {...compute_stage_snapshot()...}}
+  {"type": "insert" | "update", "seq": n, "lane": "Priority", "index": i, "entry": {...}}
+  {"type": "move", "seq": n, "from_lane": "Regular", "lane": "Priority", "index": i, "entry": {...}}
+  {"type": "remove", "seq": n, "lane": "Regular", "id": 12}
+  {"type": "batch", "seq": n, "ops": [{"type": "insert", ...}, {"type": "remove", ...}]}
+
+Every delta is applied by id (drop the id from any lane, then insert the entry at
+index), so replaying one the client already has is harmless. A client that sees a
+gap in seq sends {"type": "resync"} and receives a fresh snapshot.
+
+Changes are coalesced: saves are queued and a background thread flushes them once
+per QUEUE_BROADCAST_WINDOW seconds, sending at most one message per group per
+window. The request thread never waits on the cache or the channel layer.
+"""
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .snapshot import SNAPSHOT_TIMEOUT, STAGES, apply_queue_change
+from .utils import compute_queue_snapshot, compute_stage_snapshot
+
+logger = logging.getLogger(__name__)
+
+LEGACY_GROUP = "registration_queue"
+DELTA_GROUP = "registration_queue_delta"
+# connected legacy registration clients, across processes; a count left high by
+# a crashed server only costs the snapshot it would have skipped
+LEGACY_CLIENTS_KEY = "queueing:legacy-clients"
+
+
+def stage_group(stage):
+    """Delta-protocol group for a stage."""
+    if stage == "registration":
+        return DELTA_GROUP
+    return f"{stage}_queue"
+
+
+def _seq_key(stage):
+    if STAGES[stage]["daily"]:
+        return f"queueing:broadcast-seq:{stage}:{timezone.localdate().isoformat()}"
+    return f"queueing:broadcast-seq:{stage}"
+
+
+def current_seq(stage="registration"):
+    cache.add(_seq_key(stage), 0, SNAPSHOT_TIMEOUT)
+    return cache.get(_seq_key(stage), 0)
+
+
+def next_seq(stage="registration"):
+    try:
+        return cache.incr(_seq_key(stage))
+    except ValueError:
+        cache.add(_seq_key(stage), 1, SNAPSHOT_TIMEOUT)
+        return cache.get(_seq_key(stage), 1)
+
+
+def legacy_client_joined():
+    cache.add(LEGACY_CLIENTS_KEY, 0, None)
+    cache.incr(LEGACY_CLIENTS_KEY)
+
+
+def legacy_client_left():
+    try:
+        if cache.decr(LEGACY_CLIENTS_KEY) < 0:
+            cache.set(LEGACY_CLIENTS_KEY, 0, None)
+    except ValueError:
+        pass
+
+
+def legacy_clients():
+    return cache.get(LEGACY_CLIENTS_KEY, 0)
+
+
+def encode(message):
+    return json.dumps(message, cls=DjangoJSONEncoder)
+
+
+def snapshot_message(stage="registration", seq=None):
+    """Full snapshot of a stage as a delta-protocol message (sent on connect / resync)."""
+    if seq is None:
+        seq = current_seq(stage)
+    return encode({"type": "snapshot", "seq": seq, "data": compute_stage_snapshot(stage)})
+
+
+def _delta_body(delta):
+    body = {"type": delta["op"]}
+    body.update({k: v for k, v in delta.items() if k != "op"})
+    return body
+
+
+def delta_message(stage, delta, seq):
+    if delta["op"] == "reset":
+        return snapshot_message(stage, seq)
+    return encode({**_delta_body(delta), "seq": seq})
+
+
+def batch_message(stage, deltas, seq):
+    """One message for every delta collected in a window."""
+    if any(delta["op"] == "reset" for delta in deltas):
+        return snapshot_message(stage, seq)
+    if len(deltas) == 1:
+        return delta_message(stage, deltas[0], seq)
+    return encode({"type": "batch", "seq": seq, "ops": [_delta_body(delta) for delta in deltas]})
+
+
+def send_to_group(group, handler, text):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(group, {"type": handler, "text": text})
+    except Exception:
+        logger.exception("Failed to broadcast %s to %s", handler, group)
+
+
+def flush_changes(changes):
+    """Apply a window's worth of (instance, deleted) changes and notify each affected stage once."""
+    today = timezone.localdate()
+    deltas = {stage: [] for stage in STAGES}
+    for instance, deleted in changes:
+        for stage, delta in apply_queue_change(instance, deleted=deleted).items():
+            # registration displays only show today's queue
+            if STAGES[stage]["daily"] and instance.queue_date != today:
+                continue
+            deltas[stage].append(delta)
+
+    for stage, stage_deltas in deltas.items():
+        if not stage_deltas:
+            continue
+        send_to_group(stage_group(stage), "queue_delta", batch_message(stage, stage_deltas, next_seq(stage)))
+        # the full legacy snapshot is only built while someone is listening for it
+        if stage == "registration" and legacy_clients() > 0:
+            send_to_group(LEGACY_GROUP, "queue_update", encode(compute_queue_snapshot()))
+
+
+class BroadcastCoalescer:
+    """
+    Collects queue changes and flushes them from a daemon thread once per window.
+    A window of 0 flushes inline, which keeps tests and management commands simple.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def submit(self, instance, deleted=False):
+        if self.window <= 0:
+            flush_changes([(instance, deleted)])
+            return
+
+        with self._lock:
+            self._pending.append((instance, deleted))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="queue-broadcast", daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+
+    def _take_pending(self):
+        with self._lock:
+            changes, self._pending = self._pending, []
+            self._wakeup.clear()
+        return changes
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # debounce: let the rest of the burst arrive before flushing
+            time.sleep(self.window)
+            changes = self._take_pending()
+            if not changes:
+                continue
+            try:
+                flush_changes(changes)
+            except Exception:
+                logger.exception("Queue broadcast flush failed")
+            finally:
+                close_old_connections()
+
+
+coalescer = BroadcastCoalescer(getattr(settings, "QUEUE_BROADCAST_WINDOW", 0.15))
+
+
+def queue_changed(instance, deleted=False):
+    """Record a queue row change; the displays are notified at the end of the window."""
+    coalescer.submit(instance, deleted=deleted)
@@ -1,44 +1,90 @@
 import json
+import logging
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .broadcast import LEGACY_GROUP, legacy_client_joined, legacy_client_left, snapshot_message, stage_group
+
+logger = logging.getLogger(__name__)
+
+
+class QueueStageConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes one queue stage (assessment, treatment, lab) to the screens that render it:
+    a snapshot on connect, then sequenced deltas (see queueing.broadcast).
+    """
+    stage = None
 
-class RegistrationQueueConsumer(AsyncWebsocketConsumer):
     async def connect(self):
+        self.stage = self.stage or self.scope["url_route"]["kwargs"]["stage"]
+        self.delta_protocol = True
+        self.group_name = stage_group(self.stage)
+        await self.join()
+
+    async def join(self):
         # Accept the connection first
         await self.accept()
-        
+
         # Then add to group
         await self.channel_layer.group_add(
-            "registration_queue",
+            self.group_name,
             self.channel_name
         )
-        
-        print(f"✅ WebSocket client connected: {self.channel_name}")
-        print(f"📊 Added to group: registration_queue")
+        logger.debug("WebSocket client %s joined %s", self.channel_name, self.group_name)
+
+        if self.delta_protocol:
+            await self.send_snapshot()
 
     async def disconnect(self, close_code):
         # Remove from group
         await self.channel_layer.group_discard(
-            "registration_queue",
+            self.group_name,
             self.channel_name
         )
-        print(f"❌ WebSocket client disconnected: {self.channel_name}")
+        logger.debug("WebSocket client %s left %s", self.channel_name, self.group_name)
 
-    async def receive(self, text_data):
-        # Handle incoming messages from client (if needed)
+    async def receive(self, text_data=None, bytes_data=None):
+        # Handle incoming messages from client
         try:
-            data = json.loads(text_data)
-            print(f"📨 Received message from client: {data}")
+            data = json.loads(text_data or "")
         except json.JSONDecodeError:
-            print("❌ Error parsing incoming WebSocket message")
+            logger.warning("Unparseable WebSocket message from %s", self.channel_name)
+            return
+
+        if isinstance(data, dict) and data.get("type") == "resync" and self.delta_protocol:
+            await self.send_snapshot()
+
+    async def send_snapshot(self):
+        text = await database_sync_to_async(snapshot_message)(self.stage)
+        await self.send(text_data=text)
+
+    async def queue_delta(self, event):
+        await self.send(text_data=event["text"])
+
+
+class RegistrationQueueConsumer(QueueStageConsumer):
+    stage = "registration"
+
+    async def connect(self):
+        # ?protocol=delta opts in to snapshot + sequenced deltas
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.delta_protocol = query.get("protocol", [""])[0] == "delta"
+        self.group_name = stage_group(self.stage) if self.delta_protocol else LEGACY_GROUP
+        if not self.delta_protocol:
+            await database_sync_to_async(legacy_client_joined)()
+        await self.join()
+
+    async def disconnect(self, close_code):
+        await super().disconnect(close_code)
+        if not self.delta_protocol:
+            await database_sync_to_async(legacy_client_left)()
 
     async def queue_update(self, event):
-        # Send queue updates to client
-        data = event["data"]
-        print(f"📤 Sending queue_update to client: {self.channel_name}")
-        print(f"📦 Data being sent: {data}")
-        
-        try:
-            await self.send(text_data=json.dumps(data))
-            print(f"✅ Message successfully sent to {self.channel_name}")
-        except Exception as e:
-            print(f"❌ Error sending message to {self.channel_name}: {e}")
\ No newline at end of file
+        # Full snapshot for legacy clients; already JSON encoded by the sender
+        if "text" in event:
+            await self.send(text_data=event["text"])
+        else:
+            await self.send(text_data=json.dumps(event["data"], cls=DjangoJSONEncoder))
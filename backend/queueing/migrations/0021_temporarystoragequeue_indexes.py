@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient', '0022_remove_healthtips_patient_hea_status_ab7ca1_idx_and_more'),
+        ('queueing', '0020_alter_temporarystoragequeue_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='temporarystoragequeue',
+            index=models.Index(condition=models.Q(('status__in', ['Completed', 'Cancelled']), _negated=True), fields=['status', 'priority_level', 'queue_date', 'position'], name='tsq_active_lane_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='temporarystoragequeue',
+            index=models.Index(condition=models.Q(('status__in', ['Completed', 'Cancelled']), _negated=True), fields=['status', 'priority_level', 'created_at'], name='tsq_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='temporarystoragequeue',
+            index=models.Index(fields=['queue_date', 'queue_number'], name='tsq_date_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='temporarystoragequeue',
+            index=models.Index(fields=['queue_date', 'position'], name='tsq_date_position_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='temporarystoragequeue',
+            index=models.Index(fields=['patient', '-created_at'], name='tsq_patient_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-17 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queueing', '0021_temporarystoragequeue_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueueCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue_date', models.DateField(unique=True)),
+                ('last_number', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,7 +1,9 @@
+import copy
 from datetime import date
 from django.utils import timezone
 from django.db import models
 from patient.models import Patient, Diagnosis, Prescription
+from patient.demographics import age_on
 from  django.utils.timezone import now
 from django.conf import settings
 from user.models import UserAccount
@@ -10,6 +12,9 @@ from django.db import models
 from django.utils.timezone import now
 from patient.models import Patient
 from django.db.models import Max
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
 
 class TemporaryStorageQueue(models.Model):
     PRIORITY_CHOICES = [
@@ -83,12 +88,11 @@ class TemporaryStorageQueue(models.Model):
     def save(self, *args, **kwargs):
         # Only auto-generate queue_number when it is not supplied
         if self.queue_number is None:
-            # get the max queue_number for the same date, handle None safely
-            max_q = TemporaryStorageQueue.objects.filter(
-                queue_date=self.queue_date
-            ).aggregate(Max('queue_number'))['queue_number__max'] or 0
-
-            self.queue_number = max_q + 1
+            self.queue_number = QueueCounter.allocate(self.queue_date)
+        # new rows join the end of the day's queue unless placed explicitly
+        if self._state.adding and not self.position:
+            from .positions import next_position
+            self.position = next_position(self.queue_date)
 
         super().save(*args, **kwargs)
         
@@ -100,10 +104,7 @@ class TemporaryStorageQueue(models.Model):
 
     def get_age(self) -> int | None:
         dob = getattr(self, "temp_date_of_birth", None) or getattr(self, "date_of_birth", None)
-        if not dob:
-            return None
-        today = timezone.localdate()
-        return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+        return age_on(dob)
         
     @property
     def display_name(self):
@@ -121,6 +122,107 @@ class TemporaryStorageQueue(models.Model):
 
         return f"Patient {name} ({patient_id}) - Queue {self.queue_number} ({self.priority_level})"
 
+    class Meta:
+        indexes = [
+            # stage lanes: registration reads one queue_date, the other stages order by created_at;
+            # only rows still in the queue are indexed
+            models.Index(
+                fields=["status", "priority_level", "queue_date", "position"],
+                name="tsq_active_lane_idx",
+                condition=~models.Q(status__in=["Completed", "Cancelled"]),
+            ),
+            models.Index(
+                fields=["status", "priority_level", "created_at"],
+                name="tsq_active_created_idx",
+                condition=~models.Q(status__in=["Completed", "Cancelled"]),
+            ),
+            models.Index(fields=["queue_date", "queue_number"], name="tsq_date_number_idx"),
+            models.Index(fields=["queue_date", "position"], name="tsq_date_position_idx"),
+            models.Index(fields=["patient", "-created_at"], name="tsq_patient_recent_idx"),
+        ]
+
+
+class QueueCounter(models.Model):
+    """Last queue number handed out for each queue_date."""
+    queue_date = models.DateField(unique=True)
+    last_number = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.queue_date}: {self.last_number}"
+
+    @classmethod
+    def allocate(cls, queue_date=None, wrap=None):
+        """
+        Take the next queue number for queue_date with one atomic
+        UPDATE ... RETURNING on the day's counter row, so concurrent
+        registrations never get the same number. The first number of a day
+        creates the row, continuing after any number already issued that day.
+        With wrap, numbers cycle through 1..wrap.
+        """
+        queue_date = queue_date or timezone.localdate()
+        table = connection.ops.quote_name(cls._meta.db_table)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET last_number = last_number + 1 "
+                f"WHERE queue_date = %s RETURNING last_number",
+                [queue_date],
+            )
+            row = cursor.fetchone()
+            if row is None:
+                issued = TemporaryStorageQueue.objects.filter(
+                    queue_date=queue_date
+                ).aggregate(Max('queue_number'))['queue_number__max'] or 0
+                # another request may create the row first; then just increment it
+                cursor.execute(
+                    f"INSERT INTO {table} (queue_date, last_number) VALUES (%s, %s) "
+                    f"ON CONFLICT (queue_date) DO UPDATE SET last_number = {table}.last_number + 1 "
+                    f"RETURNING last_number",
+                    [queue_date, issued + 1],
+                )
+                row = cursor.fetchone()
+
+        number = row[0]
+        if wrap:
+            number = (number - 1) % wrap + 1
+        return number
+
+
+# Receivers hand a copy to the broadcaster: the instance can still change
+# (delete() clears its pk) before the change is flushed after commit.
+@receiver(post_save, sender=TemporaryStorageQueue)
+def update_queue_snapshot(sender, instance, **kwargs):
+    from .broadcast import queue_changed
+    saved = copy.copy(instance)
+    transaction.on_commit(lambda: queue_changed(saved))
+
+
+@receiver(post_delete, sender=TemporaryStorageQueue)
+def remove_from_queue_snapshot(sender, instance, **kwargs):
+    from .broadcast import queue_changed
+    removed = copy.copy(instance)
+    transaction.on_commit(lambda: queue_changed(removed, deleted=True))
+
+
+
+# visits rollup for the monthly report (patient.rollups)
+@receiver(pre_save, sender=TemporaryStorageQueue)
+def remember_visit_row(sender, instance, update_fields=None, **kwargs):
+    from patient.rollups import remember_previous
+    remember_previous(sender, instance, update_fields)
+
+
+@receiver(post_save, sender=TemporaryStorageQueue)
+def count_visit(sender, instance, created, update_fields=None, **kwargs):
+    from patient.rollups import record_saved
+    record_saved(sender, instance, created, update_fields)
+
+
+@receiver(post_delete, sender=TemporaryStorageQueue)
+def uncount_visit(sender, instance, **kwargs):
+    from patient.rollups import record_deleted
+    record_deleted(sender, instance)
+
 
 
     
@@ -162,4 +264,39 @@ class Treatment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)  
     objects = TreatmentManager()
     def __str__(self):
-        return f"Treatment for {self.patient.first_name} {self.patient.last_name}"
\ No newline at end of file
+        return f"Treatment for {self.patient.first_name} {self.patient.last_name}"
+
+
+# Adding diagnoses / prescriptions to a treatment does not save the treatment;
+# touch updated_at so caches keyed on it (patient.report, patient.records) see the change.
+@receiver(m2m_changed, sender=Treatment.diagnoses.through)
+@receiver(m2m_changed, sender=Treatment.prescriptions.through)
+def touch_treatment(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    from patient.records import records_changed
+    from backend.response_cache import models_changed
+    treatments = Treatment.objects.filter(pk__in=pk_set or []) if reverse else Treatment.objects.filter(pk=instance.pk)
+    treatments.update(updated_at=timezone.now())
+    # either side (treatment, diagnosis or prescription) belongs to the patient
+    records_changed(instance.patient_id)
+    models_changed(Treatment)
+
+
+@receiver(post_save, sender=Treatment)
+@receiver(post_delete, sender=Treatment)
+def treatment_changed(sender, instance, **kwargs):
+    from patient.records import records_changed
+    from backend.response_cache import models_changed
+    records_changed(instance.patient_id)
+    models_changed(sender)
+
+
+# the patient report shows the latest assessment and every visit's complaint (patient.report)
+@receiver(post_save, sender=PreliminaryAssessment)
+@receiver(post_delete, sender=PreliminaryAssessment)
+@receiver(post_save, sender=TemporaryStorageQueue)
+@receiver(post_delete, sender=TemporaryStorageQueue)
+def report_source_changed(sender, instance, **kwargs):
+    from patient.records import records_changed
+    records_changed(instance.patient_id)
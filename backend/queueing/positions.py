@@ -0,0 +1,67 @@
+"""
+Sparse ordering for TemporaryStorageQueue.position.
+
+Positions within a queue_date are spaced POSITION_GAP apart, so a row can be
+placed between two others by taking the midpoint: inserting or moving a
+patient writes one row. Only when two neighbours are adjacent is the day
+renumbered, in a single UPDATE.
+"""
+from django.db import connection, transaction
+
+from .models import TemporaryStorageQueue
+from .snapshot import invalidate_queue_snapshot
+
+POSITION_GAP = 1024
+
+
+def next_position(queue_date):
+    """Position at the end of the day's queue."""
+    last = (
+        TemporaryStorageQueue.objects
+        .filter(queue_date=queue_date)
+        .order_by("-position")
+        .values_list("position", flat=True)
+        .first()
+    )
+    return max(last or 0, 0) + POSITION_GAP
+
+
+def rebalance_positions(queue_date):
+    """Renumber the day's positions to POSITION_GAP, 2 * POSITION_GAP, ... in their current order."""
+    table = connection.ops.quote_name(TemporaryStorageQueue._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET position = ranked.rn * %s "
+            f"FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY position, queue_number, id) AS rn "
+            f"      FROM {table} WHERE queue_date = %s) AS ranked "
+            f"WHERE {table}.id = ranked.id",
+            [POSITION_GAP, queue_date],
+        )
+    # bulk update skips post_save, so drop the cached snapshot
+    transaction.on_commit(lambda: invalidate_queue_snapshot(queue_date))
+
+
+def ensure_positions(queue_date):
+    """Give rows created before sparse positions (position <= 0) a place, once per day."""
+    if TemporaryStorageQueue.objects.filter(queue_date=queue_date, position__lte=0).exists():
+        rebalance_positions(queue_date)
+
+
+def position_after(entry):
+    """A free position between entry and the row that follows it on the same day."""
+    following = (
+        TemporaryStorageQueue.objects
+        .filter(queue_date=entry.queue_date, position__gt=entry.position)
+        .order_by("position")
+        .values_list("position", flat=True)
+        .first()
+    )
+    if following is None:
+        return entry.position + POSITION_GAP
+    if following - entry.position > 1:
+        return (entry.position + following) // 2
+
+    # no room left between the two: respace the day and try again
+    rebalance_positions(entry.queue_date)
+    entry.refresh_from_db(fields=["position"])
+    return position_after(entry)
@@ -3,4 +3,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/queue/registration/$', consumers.RegistrationQueueConsumer.as_asgi()),
+    re_path(r'ws/queue/(?P<stage>assessment|treatment|lab)/$', consumers.QueueStageConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -33,11 +33,16 @@ class TemporaryStorageQueueSerializer(serializers.ModelSerializer):
         return obj.get_age()
     
     def get_queue_number(self, obj):
-        queue = TemporaryStorageQueue.objects.filter(
-            priority_level=obj.priority_level, status='Waiting'
-        ).order_by('created_at')
-        queue_list = list(queue)
-        return f'#{queue_list.index(obj) + 1}' if obj in queue_list else 'N/A'
+        # RegistrationViewSet.list annotates the rank with a window function
+        if hasattr(obj, 'waiting_rank'):
+            return f'#{obj.waiting_rank}' if obj.waiting_rank else 'N/A'
+
+        if obj.status != 'Waiting':
+            return 'N/A'
+        ahead = TemporaryStorageQueue.objects.filter(
+            priority_level=obj.priority_level, status='Waiting', created_at__lt=obj.created_at
+        ).count()
+        return f'#{ahead + 1}'
     
     def get_queue_data(self, obj):
         """
@@ -49,21 +54,25 @@ class TemporaryStorageQueueSerializer(serializers.ModelSerializer):
         if not patient:
             return None
 
-        # 2) prefer using the related manager if it exists and is usable
+        # 2) use the entries prefetched by RegistrationViewSet when present
+        waiting_entries = getattr(patient, "waiting_entries", None)
         related_manager = getattr(patient, "temporarystoragequeue", None)
-        if related_manager is not None:
+        if waiting_entries is not None:
+            queue_info = waiting_entries[0] if waiting_entries else None
+        # 3) otherwise prefer using the related manager if it exists and is usable
+        elif related_manager is not None:
             try:
                 queue_info = related_manager.filter(status="Waiting").order_by("created_at").first()
             except Exception:
                 queue_info = None
         else:
-            # 3) fallback: query by patient FK
+            # 4) fallback: query by patient FK
             try:
                 queue_info = TemporaryStorageQueue.objects.filter(patient=patient, status="Waiting").order_by("created_at").first()
             except Exception:
                 queue_info = None
 
-        # 4) return a simple dict or None
+        # 5) return a simple dict or None
         if not queue_info:
             return None
 
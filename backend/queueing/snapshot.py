@@ -0,0 +1,222 @@
+"""
+Incremental snapshots of the queue stages.
+
+Each stage (registration, assessment, treatment, lab) keeps its entries in the
+Django cache as two ordered lanes (Priority / Regular). Saves and deletes on
+TemporaryStorageQueue apply a delta to the cached lanes instead of re-reading
+the whole stage. A revision counter per stage guards against lost updates:
+the cached snapshot is only trusted when its revision matches the counter,
+otherwise it is rebuilt from the database.
+
+Registration is scoped per day (the displays show today's Waiting entries);
+the other stages match their REST endpoints and hold every entry in the stage.
+"""
+import bisect
+
+from django.core.cache import cache
+from django.utils import timezone
+from patient.demographics import age_on
+
+from .stages import LANES, STAGES, stage_lanes
+
+# bump when the shape of a cached entry changes so old snapshots are rebuilt
+SNAPSHOT_SCHEMA = 2
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+
+def _scope(stage, day=None):
+    if STAGES[stage]["daily"]:
+        return f"{stage}:{(day or timezone.localdate()).isoformat()}"
+    return stage
+
+
+def _snapshot_key(scope):
+    return f"queueing:snapshot:{scope}"
+
+
+def _revision_key(scope):
+    return f"queueing:snapshot-rev:{scope}"
+
+
+def _sort_key(stage):
+    order = STAGES[stage]["order"]
+    return lambda entry: tuple(entry[field] or 0 for field in order)
+
+
+def _entry_day(q):
+    return q.queue_date or timezone.localdate()
+
+
+def _current_revision(scope):
+    key = _revision_key(scope)
+    cache.add(key, 0, SNAPSHOT_TIMEOUT)
+    return cache.get(key, 0)
+
+
+def _next_revision(scope):
+    key = _revision_key(scope)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # counter expired or was evicted; restart it
+        cache.add(key, 1, SNAPSHOT_TIMEOUT)
+        return cache.get(key, 1)
+
+
+def format_queue_entry(q):
+    """Serialize a TemporaryStorageQueue row the way the queue displays expect it."""
+    if not q:
+        return None
+
+    if q.patient:
+        patient = q.patient
+        first_name = patient.first_name
+        last_name = patient.last_name
+        phone = patient.phone_number
+        dob = patient.date_of_birth
+        pid = patient.patient_id
+        is_new_patient = False
+    else:
+        # New patient - get data from temporary fields
+        first_name = q.temp_first_name
+        last_name = q.temp_last_name
+        phone = q.temp_phone_number
+        dob = q.temp_date_of_birth
+        pid = None
+        is_new_patient = True
+
+    age = age_on(dob)
+
+    return {
+        "id": q.id,
+        "patient_id": pid,
+        "first_name": first_name,
+        "last_name": last_name,
+        "phone_number": phone,
+        "date_of_birth": dob,
+        "age": age,
+        "priority_level": q.priority_level,
+        "complaint": q.complaint,
+        "status": q.status,
+        "queue_number": q.queue_number,
+        "position": q.position,
+        "created_at": q.created_at,
+        "queue_date": q.queue_date,
+        "is_new_patient": is_new_patient,
+    }
+
+
+def build_lanes(stage, day=None):
+    """Full rebuild of one stage's lanes from the database."""
+    return stage_lanes(stage, day)
+
+
+def get_versioned_lanes(stage="registration", day=None):
+    """
+    Return (revision, lanes) for a stage (and day, default today, for the
+    daily stages), where lanes is {"Priority": [...], "Regular": [...]} served
+    from the cache and rebuilt on a miss or revision mismatch.
+    """
+    scope = _scope(stage, day)
+    revision = _current_revision(scope)
+    cached = cache.get(_snapshot_key(scope))
+    if cached and cached.get("schema") == SNAPSHOT_SCHEMA and cached.get("rev") == revision:
+        return revision, cached["lanes"]
+
+    lanes = build_lanes(stage, day)
+    cache.set(
+        _snapshot_key(scope),
+        {"schema": SNAPSHOT_SCHEMA, "rev": revision, "lanes": lanes},
+        SNAPSHOT_TIMEOUT,
+    )
+    return revision, lanes
+
+
+def get_lanes(stage="registration", day=None):
+    return get_versioned_lanes(stage, day)[1]
+
+
+def invalidate_queue_snapshot(day=None, stage="registration"):
+    """Force the next read of a stage to rebuild (use after bulk .update() calls)."""
+    scope = _scope(stage, day)
+    _next_revision(scope)
+    cache.delete(_snapshot_key(scope))
+
+
+def _holds(cached, entry_id):
+    return any(entry["id"] == entry_id for lane in cached["lanes"].values() for entry in lane)
+
+
+def _apply_to_stage(stage, q, deleted):
+    scope = _scope(stage, _entry_day(q))
+    cached = cache.get(_snapshot_key(scope))
+    if cached and cached.get("schema") != SNAPSHOT_SCHEMA:
+        cached = None
+
+    # a row neither entering the stage nor held in its cached lanes leaves the
+    # stage untouched: no revision bump, no rebuild, nothing to broadcast
+    enters = not deleted and q.status in STAGES[stage]["statuses"] and q.priority_level in LANES
+    if not enters and not (cached and _holds(cached, q.id)):
+        return None
+
+    revision = _next_revision(scope)
+    if not cached or cached.get("rev") != revision - 1:
+        # cold cache, or another writer got in between: rebuild from the database
+        cache.delete(_snapshot_key(scope))
+        get_versioned_lanes(stage, _entry_day(q))
+        return {"op": "reset"}
+
+    lanes = cached["lanes"]
+    old_lane = old_index = None
+    for lane_name, lane in lanes.items():
+        for index, entry in enumerate(lane):
+            if entry["id"] == q.id:
+                old_lane, old_index = lane_name, index
+                del lane[index]
+                break
+        if old_lane:
+            break
+
+    new_lane = new_index = new_entry = None
+    if enters and q.priority_level in lanes:
+        sort_key = _sort_key(stage)
+        new_lane = q.priority_level
+        new_entry = format_queue_entry(q)
+        new_index = bisect.bisect_right(lanes[new_lane], sort_key(new_entry), key=sort_key)
+        lanes[new_lane].insert(new_index, new_entry)
+
+    cached["rev"] = revision
+    cache.set(_snapshot_key(scope), cached, SNAPSHOT_TIMEOUT)
+
+    if old_lane is None and new_lane is None:
+        return None
+    if new_lane is None:
+        return {"op": "remove", "lane": old_lane, "id": q.id}
+    if old_lane is None:
+        return {"op": "insert", "lane": new_lane, "index": new_index, "entry": new_entry}
+    if (old_lane, old_index) == (new_lane, new_index):
+        return {"op": "update", "lane": new_lane, "index": new_index, "entry": new_entry}
+    return {"op": "move", "from_lane": old_lane, "lane": new_lane, "index": new_index, "entry": new_entry}
+
+
+def apply_queue_change(q, deleted=False):
+    """
+    Apply one saved/deleted TemporaryStorageQueue row to every stage's cached
+    lanes. The row is removed from whichever stage and lane held it and
+    re-inserted in order into the stage matching its current status.
+
+    Returns {stage: delta} for the stages whose lanes changed, where delta is
+      {"op": "reset"}                              - no usable snapshot of a stage the
+                                                     row enters or was in, it was rebuilt
+      {"op": "remove", "lane", "id"}
+      {"op": "insert" | "update", "lane", "index", "entry"}
+      {"op": "move", "from_lane", "lane", "index", "entry"}
+    """
+    # the previous status is unknown, so every stage is checked for the id;
+    # stages the row is neither in nor entering are skipped without a rebuild
+    deltas = {}
+    for stage in STAGES:
+        delta = _apply_to_stage(stage, q, deleted)
+        if delta is not None:
+            deltas[stage] = delta
+    return deltas
@@ -0,0 +1,80 @@
+"""
+Read service for the queue stages.
+
+A stage (registration, assessment, treatment, lab) is the set of
+TemporaryStorageQueue rows in one or more statuses, split into the Priority
+and Regular lanes. stage_lanes() reads a whole stage with one query joined to
+the patient, with the display fields and the age computed by the database,
+and returns plain dicts in the same shape as snapshot.format_queue_entry().
+"""
+from django.db.models import Case, F, When
+from django.utils import timezone
+from patient.demographics import age_expression
+
+from .models import TemporaryStorageQueue
+
+LANES = ("Priority", "Regular")
+
+# stage -> queue statuses it shows, ordering of its lanes, and whether it is per day
+STAGES = {
+    "registration": {"statuses": ("Waiting",), "order": ("position", "queue_number"), "daily": True},
+    "assessment": {"statuses": ("Queued for Assessment",), "order": ("created_at",), "daily": False},
+    "treatment": {"statuses": ("Queued for Treatment",), "order": ("created_at",), "daily": False},
+    "lab": {"statuses": ("Ongoing for Laboratory",), "order": ("created_at",), "daily": False},
+}
+
+
+def _patient_or_temp(field, temp_field):
+    # registered patients come from the patient row, new ones from the temp_* columns
+    return Case(
+        When(patient__isnull=False, then=F(f"patient__{field}")),
+        default=F(temp_field),
+    )
+
+
+def stage_queryset(stage, day=None):
+    """Rows of one stage (both lanes), in display order, as dicts."""
+    config = STAGES[stage]
+    rows = (
+        TemporaryStorageQueue.objects
+        .filter(status__in=config["statuses"], priority_level__in=LANES)
+        .annotate(
+            entry_first_name=_patient_or_temp("first_name", "temp_first_name"),
+            entry_last_name=_patient_or_temp("last_name", "temp_last_name"),
+            entry_phone_number=_patient_or_temp("phone_number", "temp_phone_number"),
+            entry_date_of_birth=_patient_or_temp("date_of_birth", "temp_date_of_birth"),
+        )
+        .annotate(entry_age=age_expression("entry_date_of_birth"))
+        .order_by(*config["order"])
+    )
+    if config["daily"]:
+        rows = rows.filter(queue_date=day or timezone.localdate())
+    return rows.values(
+        "id", "patient_id", "priority_level", "complaint", "status", "queue_number",
+        "position", "created_at", "queue_date", "entry_first_name", "entry_last_name",
+        "entry_phone_number", "entry_date_of_birth", "entry_age",
+    )
+
+
+def stage_lanes(stage, day=None):
+    """{"Priority": [...], "Regular": [...]} for a stage, read with a single query."""
+    lanes = {lane: [] for lane in LANES}
+    for row in stage_queryset(stage, day):
+        lanes[row["priority_level"]].append({
+            "id": row["id"],
+            "patient_id": row["patient_id"],
+            "first_name": row["entry_first_name"],
+            "last_name": row["entry_last_name"],
+            "phone_number": row["entry_phone_number"],
+            "date_of_birth": row["entry_date_of_birth"],
+            "age": row["entry_age"],
+            "priority_level": row["priority_level"],
+            "complaint": row["complaint"],
+            "status": row["status"],
+            "queue_number": row["queue_number"],
+            "position": row["position"],
+            "created_at": row["created_at"],
+            "queue_date": row["queue_date"],
+            "is_new_patient": row["patient_id"] is None,
+        })
+    return lanes
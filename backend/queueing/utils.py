@@ -1,82 +1,11 @@
-from .models import TemporaryStorageQueue
 from django.utils.timezone import localdate
-from datetime import date
 
-def compute_queue_snapshot():
-    today = localdate()
-    
-    priority = TemporaryStorageQueue.objects.filter(
-        status="Waiting",
-        priority_level="Priority",
-        created_at__date=today
-    ).order_by("position", "queue_number")
-    
-    regular = TemporaryStorageQueue.objects.filter(
-        status="Waiting",
-        priority_level="Regular", 
-        created_at__date=today
-    ).order_by("position", "queue_number")
-
-    def fmt(q):
-        if not q:
-            return None           
-
-        if q.patient:
-            patient = q.patient
-            first_name = patient.first_name
-            last_name = patient.last_name
-            phone = patient.phone_number
-            dob = patient.date_of_birth
-            pid = patient.patient_id
-            is_new_patient = False
-        else:
-            # New patient - get data from temporary fields
-            first_name = q.temp_first_name
-            last_name = q.temp_last_name
-            phone = q.temp_phone_number
-            dob = q.temp_date_of_birth
-            pid = None
-            is_new_patient = True
+from .snapshot import get_lanes
 
-        # compute age
-        if dob:
-            try:
-                # Handle both string and date objects
-                if isinstance(dob, str):
-                    dob_date = date.fromisoformat(dob)
-                else:
-                    dob_date = dob
-                    
-                today0 = date.today()
-                age = today0.year - dob_date.year - (
-                    (today0.month, today0.day) < (dob_date.month, dob_date.day)
-                )
-            except Exception as e:
-                print(f"Error calculating age: {e}")
-                age = None
-        else:
-            age = None
 
-        return {
-            "id": q.id,
-            "patient_id": pid,
-            "first_name": first_name,
-            "last_name": last_name,
-            "phone_number": phone,
-            "date_of_birth": dob,
-            "age": age,
-            "priority_level": q.priority_level,
-            "complaint": q.complaint,
-            "status": q.status,
-            "queue_number": q.queue_number,
-            "position": q.position,
-            "created_at": q.created_at,
-            "is_new_patient": is_new_patient,
-        }
-
-    # Return ALL patients, not just first 3
-    priority_list = [fmt(p) for p in priority]
-    regular_list = [fmt(r) for r in regular]
+def queue_response(lanes):
+    priority_list = list(lanes["Priority"])
+    regular_list = list(lanes["Regular"])
 
     return {
         "priority_queue": priority_list,  # All priority patients
@@ -88,4 +17,13 @@ def compute_queue_snapshot():
         "regular_current": regular_list[0] if len(regular_list) > 0 else None,
         "regular_next1": regular_list[1] if len(regular_list) > 1 else None,
         "regular_next2": regular_list[2] if len(regular_list) > 2 else None,
-    }
\ No newline at end of file
+    }
+
+
+def compute_stage_snapshot(stage, day=None):
+    # Served from the incremental snapshot; only rebuilt on cache miss
+    return queue_response(get_lanes(stage, day))
+
+
+def compute_queue_snapshot():
+    return compute_stage_snapshot("registration", localdate())
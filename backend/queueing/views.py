@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from .models import Patient, TemporaryStorageQueue, Treatment
 from .serializers import PreliminaryAssessmentSerializer, TemporaryStorageQueueSerializer
 from backend.supabase_client import supabase
+from backend.response_cache import cached_response
 
 
 from rest_framework.response import Response
@@ -14,13 +15,17 @@ from rest_framework import status
 
 from patient.models import Diagnosis, Prescription
 from medicine.models import Medicine
+from medicine.autocomplete import medicine_index
 
 from user.permissions import IsMedicalStaff, isDoctor, isSecretary, IsTreatmentParticipant
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from django.db.models import Case, F, IntegerField, Prefetch, When, Window
+from django.db.models.functions import RowNumber
 from appointment.models import AppointmentReferral, Appointment
 # display patient registration queue
-from .utils import compute_queue_snapshot
+from .stages import stage_lanes
+from .utils import compute_queue_snapshot, queue_response
 
 class PatientRegistrationQueue(APIView):
     permission_classes = []
@@ -38,86 +43,10 @@ class PatientRegistrationQueue(APIView):
 class PreliminaryAssessmentQueue(APIView):
     permission_classes = []
     def get(self, request):
-        table_name = 'queueing_temporarystoragequeue'
-
         try:
-            # Fetch Priority Queue
-            priority_response = supabase.table(table_name).select(
-                "id, patient_id, status, created_at, priority_level, complaint", 'queue_number', 'queue_date'
-            ).eq('status', 'Queued for Assessment').eq('priority_level', 'Priority').order('created_at').execute()
-
-            # Fetch Regular Queue
-            regular_response = supabase.table(table_name).select(
-                "id, patient_id, status, created_at, priority_level, complaint",  'queue_number', 'queue_date'
-            ).eq('status', 'Queued for Assessment').eq('priority_level', 'Regular').order('created_at').execute()
-
-            # Access the data attribute directly
-            priority_patients = priority_response.data if hasattr(priority_response, 'data') else []
-            regular_patients = regular_response.data if hasattr(regular_response, 'data') else []
-
-            def get_next_patients(queue):
-                current = queue[0] if len(queue) > 0 else None
-                next1 = queue[1] if len(queue) > 1 else None
-                next2 = queue[2] if len(queue) > 2 else None
-                return current, next1, next2
-
-            # Fetch patient details for the priority queue
-            priority_patient_ids = [queue["patient_id"] for queue in priority_patients]
-            priority_patients_details_response = supabase.table("patient_patient").select(
-                "patient_id, first_name, last_name, date_of_birth, phone_number"
-            ).in_("patient_id", priority_patient_ids).execute()
-
-            # Fetch patient details for the regular queue
-            regular_patient_ids = [queue["patient_id"] for queue in regular_patients]
-            regular_patients_details_response = supabase.table("patient_patient").select(
-                "patient_id, first_name, last_name, date_of_birth, phone_number"
-            ).in_("patient_id", regular_patient_ids).execute()
-
-            # Access patient data
-            priority_patients_data = priority_patients_details_response.data if hasattr(priority_patients_details_response, 'data') else []
-            regular_patients_data = regular_patients_details_response.data if hasattr(regular_patients_details_response, 'data') else []
-
-            # Merge patient data with queue data and add age using the get_age() method
-            for queue_item in priority_patients:
-                patient = next((patient for patient in priority_patients_data if patient["patient_id"] == queue_item["patient_id"]), None)
-                if patient:
-                    patient_obj = Patient.objects.get(patient_id=patient["patient_id"])  # Get the full patient object
-                    queue_item.update({
-                        "first_name": patient["first_name"],
-                        "last_name": patient["last_name"],
-                        "phone_number": patient["phone_number"],
-                        "date_of_birth": patient["date_of_birth"],
-                        "age": patient_obj.get_age()  # Using get_age() method here
-                    })
-
-            for queue_item in regular_patients:
-                patient = next((patient for patient in regular_patients_data if patient["patient_id"] == queue_item["patient_id"]), None)
-                if patient:
-                    patient_obj = Patient.objects.get(patient_id=patient["patient_id"])  # Get the full patient object
-                    queue_item.update({
-                        "first_name": patient["first_name"],
-                        "last_name": patient["last_name"],
-                        "phone_number": patient["phone_number"],
-                        "date_of_birth": patient["date_of_birth"],
-                        "age": patient_obj.get_age()  # Using get_age() method here
-                    })
-
-            # Get the next patients
-            priority_current, priority_next1, priority_next2 = get_next_patients(priority_patients)
-            regular_current, regular_next1, regular_next2 = get_next_patients(regular_patients)
-
-            # Return the response with explicit renderer
-            return Response(
-                {
-                    "priority_current": priority_current,
-                    "priority_next1": priority_next1,
-                    "priority_next2": priority_next2,
-                    "regular_current": regular_current,
-                    "regular_next1": regular_next1,
-                    "regular_next2": regular_next2
-                },
-                status=status.HTTP_200_OK
-            )
+            # one query for both lanes, patient details and age joined in the database
+            lanes = stage_lanes("assessment")
+            return Response(queue_response(lanes), status=status.HTTP_200_OK)
 
         except Exception as e:
             # In case of errors, return a 500 error
@@ -128,86 +57,9 @@ class PreliminaryAssessmentQueue(APIView):
 class PatientTreatmentQueue(APIView):
     permission_classes = [isDoctor]
     def get(self, request):
-        table_name = 'queueing_temporarystoragequeue'
-
         try:
-            # Fetch Priority Queue
-            priority_response = supabase.table(table_name).select(
-                "id, patient_id, status, created_at, priority_level", 'queue_number', 'complaint', 'queue_date'
-            ).eq('status', 'Queued for Treatment').eq('priority_level', 'Priority').order('created_at').execute()
-
-            # Fetch Regular Queue
-            regular_response = supabase.table(table_name).select(
-                "id, patient_id, status, created_at, priority_level",  'queue_number', 'complaint', 'queue_date'
-            ).eq('status', 'Queued for Treatment').eq('priority_level', 'Regular').order('created_at').execute()
-
-            # Access the data attribute directly
-            priority_patients = priority_response.data if hasattr(priority_response, 'data') else []
-            regular_patients = regular_response.data if hasattr(regular_response, 'data') else []
-
-            def get_next_patients(queue):
-                current = queue[0] if len(queue) > 0 else None
-                next1 = queue[1] if len(queue) > 1 else None
-                next2 = queue[2] if len(queue) > 2 else None
-                return current, next1, next2
-
-            # Fetch patient details for the priority queue
-            priority_patient_ids = [queue["patient_id"] for queue in priority_patients]
-            priority_patients_details_response = supabase.table("patient_patient").select(
-                "patient_id, first_name, last_name, date_of_birth, phone_number"
-            ).in_("patient_id", priority_patient_ids).execute()
-
-            # Fetch patient details for the regular queue
-            regular_patient_ids = [queue["patient_id"] for queue in regular_patients]
-            regular_patients_details_response = supabase.table("patient_patient").select(
-                "patient_id, first_name, last_name, date_of_birth, phone_number"
-            ).in_("patient_id", regular_patient_ids).execute()
-
-            # Access patient data
-            priority_patients_data = priority_patients_details_response.data if hasattr(priority_patients_details_response, 'data') else []
-            regular_patients_data = regular_patients_details_response.data if hasattr(regular_patients_details_response, 'data') else []
-
-            # Merge patient data with queue data and add age using the get_age() method
-            for queue_item in priority_patients:
-                patient = next((patient for patient in priority_patients_data if patient["patient_id"] == queue_item["patient_id"]), None)
-                if patient:
-                    patient_obj = Patient.objects.get(patient_id=patient["patient_id"])  # Get the full patient object
-                    queue_item.update({
-                        "first_name": patient["first_name"],
-                        "last_name": patient["last_name"],
-                        "phone_number": patient["phone_number"],
-                        "date_of_birth": patient["date_of_birth"],
-                        "age": patient_obj.get_age()  # Using get_age() method here
-                    })
-
-            for queue_item in regular_patients:
-                patient = next((patient for patient in regular_patients_data if patient["patient_id"] == queue_item["patient_id"]), None)
-                if patient:
-                    patient_obj = Patient.objects.get(patient_id=patient["patient_id"])  # Get the full patient object
-                    queue_item.update({
-                        "first_name": patient["first_name"],
-                        "last_name": patient["last_name"],
-                        "phone_number": patient["phone_number"],
-                        "date_of_birth": patient["date_of_birth"],
-                        "age": patient_obj.get_age()  # Using get_age() method here
-                    })
-
-            # Get the next patients
-            priority_current, priority_next1, priority_next2 = get_next_patients(priority_patients)
-            regular_current, regular_next1, regular_next2 = get_next_patients(regular_patients)
-
-            # Return the response with explicit renderer
-            return Response(
-                {
-                    "priority_current": priority_current,
-                    "priority_next1": priority_next1,
-                    "priority_next2": priority_next2,
-                    "regular_current": regular_current,
-                    "regular_next1": regular_next1,
-                    "regular_next2": regular_next2
-                },
-                status=status.HTTP_200_OK
-            )
+            lanes = stage_lanes("treatment")
+            return Response(queue_response(lanes), status=status.HTTP_200_OK)
 
         except Exception as e:
             # In case of errors, return a 500 error
@@ -345,13 +197,17 @@ class PatientTreatmentForm(APIView):
                     medicine = Medicine.objects.get(id=med_id)
                 else:
                     name = presc["medication"].strip()
-                    medicines = Medicine.objects.filter(name__iexact=name)
-                    if not medicines.exists():
+                    # try the in-process index first; it can miss medicines added by
+                    # another process or straight through Supabase, so the table decides
+                    medicine_ids = medicine_index.exact(name)
+                    medicine = Medicine.objects.filter(id__in=medicine_ids).order_by("id").first() if medicine_ids else None
+                    if medicine is None:
+                        medicine = Medicine.objects.filter(name__iexact=name).order_by("id").first()
+                    if medicine is None:
                         return Response(
                             {"error": f"Medicine '{name}' not found!"},
                             status=status.HTTP_400_BAD_REQUEST
                         )
-                    medicine = medicines.first()
 
                 # Check expiration
                 if medicine.expiration_date and medicine.expiration_date < date.today():
@@ -384,6 +240,38 @@ class RegistrationViewSet(viewsets.ModelViewSet):
     serializer_class = TemporaryStorageQueueSerializer
     permission_classes = [IsMedicalStaff]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            # a window over a pk-filtered queryset would only rank that row;
+            # the serializer counts the rank for single objects instead
+            return queryset
+
+        # rank within the Waiting lane and each patient's first Waiting entry,
+        # so the list is one query plus one prefetch instead of two per row
+        waiting_entries = Prefetch(
+            'patient__temporarystoragequeue',
+            queryset=TemporaryStorageQueue.objects.filter(status='Waiting').order_by('created_at'),
+            to_attr='waiting_entries',
+        )
+        return (
+            queryset
+            .select_related('patient')
+            .prefetch_related(waiting_entries)
+            .annotate(
+                waiting_rank=Case(
+                    When(status='Waiting', then=Window(
+                        RowNumber(),
+                        partition_by=[F('priority_level'), F('status')],
+                        order_by=F('created_at').asc(),
+                    )),
+                    default=None,
+                    output_field=IntegerField(),
+                )
+            )
+            .order_by('id')
+        )
+
     @action(detail=True, methods=['patch'], url_path='patient-edit')
     def patient_edit(self, request, pk=None):
         instance = self.get_object()              # resolves using pk
@@ -402,6 +290,8 @@ class RegistrationViewSet(viewsets.ModelViewSet):
 class Services(APIView):
     
     permission_classes = []
+    # Supabase-only table: no signals, the timeout bounds staleness
+    @cached_response(scope="public")
     def get(self, request):
         try:
             services = supabase.table("service").select(
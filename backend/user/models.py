@@ -3,7 +3,7 @@ from django.db import models
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, PermissionsMixin
 import random
 import string
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.utils.text import slugify
 from django.db.models import Max
@@ -161,3 +161,28 @@ class Schedule(models.Model):
 
     def __str__(self):
         return f"{self.doctor.user.get_full_name()} - {self.day_of_week} {self.start_time} to {self.end_time}"
+
+
+# cached dashboard responses (backend.response_cache)
+@receiver(post_save, sender=UserAccount)
+@receiver(post_delete, sender=UserAccount)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def user_responses_changed(sender, instance, update_fields=None, **kwargs):
+    # logins only touch last_login, which no cached response shows
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    from backend.response_cache import models_changed
+    models_changed(sender)
+
+
+# staff names and specializations show in patient records (patient.records)
+@receiver(post_save, sender=UserAccount)
+@receiver(pre_delete, sender=UserAccount)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def staff_details_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    from patient.records import staff_records_changed
+    staff_records_changed(instance.user_id if sender is Doctor else instance.pk)
@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from .models import UserAccount
 from .serializers import UserAccountSerializer
 from .permissions import IsAdminOrGeneralDoctor, IsMe, IsMedicalStaff
+from backend.response_cache import cached_response
 
 
 class UserAccountViewSet(viewsets.ModelViewSet):
@@ -202,6 +203,8 @@ class UserAccountViewSet(viewsets.ModelViewSet):
     
     
     @action(detail=False, methods=['get'], url_path='doctors')
+    # excludes the requesting user, so cached per user
+    @cached_response(scope="user", depends_on=["user.UserAccount", "user.Doctor"])
     def doctors(self, request):
         doctor_roles = ["doctor", "on-call-doctor", "on-call"]
         qs = UserAccount.objects.filter(role__in=doctor_roles, is_active=True).exclude(id=request.user.id)